@@ -18,7 +18,7 @@ You should have received a copy of the GNU General Public License along with
 this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-from alignrt_tools.generic import GenericAlignRTClass
+from alignrt_tools.generic import GenericAlignRTClass, _append_details, _concat_frames
 
 
 class Field(GenericAlignRTClass):
@@ -64,22 +64,19 @@ class Field(GenericAlignRTClass):
         A dataframe containing all of the real-time deltas for this field
 
         """
-        df = None
-
-        for surface in self.surfaces:
-
-            if df is None:
-                df = surface.get_realtimedeltas_as_dataframe()
-            else:
-                df = df.append(
-                    surface.get_realtimedeltas_as_dataframe(), ignore_index=True
-                )
+        # Concatenate the real-time deltas of the surfaces in one step. The
+        # surfaces without real-time deltas return None and are skipped.
+        frames = [
+            surface.get_realtimedeltas_as_dataframe() for surface in self.surfaces
+        ]
+        frames = [frame for frame in frames if frame is not None]
+        df = _concat_frames(frames) if frames else None
 
         # At this point, df may still yet be None
         # if this Field does not have real-time deltas
         if df is not None:
-            for key, value in self.details.items():
-                super_key = "Field Details - " + key
-                df[super_key] = value
+            # Append the field details in one call
+            details = {"Field Details - " + k: v for k, v in self.details.items()}
+            df = _append_details(df, details)
 
         return df
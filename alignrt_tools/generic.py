@@ -18,6 +18,7 @@ this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 # Import helpful libraries
+import functools
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import dateutil.parser
@@ -25,6 +26,91 @@ import numpy as np
 import pandas as pd
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_dt(dt_str):
+    """Converts an AlignRT timestamp to a datetime
+
+    AlignRT writes ISO 8601 timestamps, which datetime.fromisoformat
+    parses far faster than dateutil. Timestamps that it does not accept,
+    such as those with seven fractional digits before Python 3.11, are
+    passed to dateutil. Timestamps such as dates of birth repeat across
+    a collection, and datetimes are immutable, so the results are
+    cached.
+    """
+
+    try:
+        return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
+    except ValueError:
+        return dateutil.parser.parse(dt_str, yearfirst=True)
+
+
+def _to_bool(bool_str):
+    """Converts "true" or "false" to a boolean. Other strings are
+    returned unchanged."""
+
+    return {"true": True, "false": False}.get(bool_str, bool_str)
+
+
+def _as_column(value, length):
+    """Returns value as a column of the given length. A string repeated
+    down a column is stored as a categorical, which holds a one-byte code
+    per row instead of an object. Other values are returned for pandas
+    to broadcast."""
+
+    if isinstance(value, str):
+        codes = np.zeros(length, dtype=np.int8)
+        return pd.Categorical.from_codes(codes, categories=[value])
+
+    return value
+
+
+def _append_details(df, details):
+    """Returns a new frame with the columns of df and a column for each
+    item in details. The new columns are joined with a single concat
+    rather than inserted one at a time. The result does not share data
+    with df, so a cached df cannot be changed through it."""
+
+    length = len(df)
+    columns = {key: _as_column(value, length) for key, value in details.items()}
+    details_df = pd.DataFrame(columns, index=df.index)
+
+    return pd.concat([df, details_df], axis=1)
+
+
+def _concat_frames(frames):
+    """Returns the frames concatenated row-wise. pd.concat turns
+    categoricals with different categories into objects, so the detail
+    columns that are categorical in every frame are recombined with
+    union_categoricals to keep them categorical."""
+
+    df = pd.concat(frames, ignore_index=True)
+
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.api.types.CategoricalDtype):
+            continue
+
+        present = [frame[column] for frame in frames if column in frame]
+        if not all(
+            isinstance(part.dtype, pd.api.types.CategoricalDtype) for part in present
+        ):
+            continue
+
+        # Rows from a frame without the column are missing values. Their
+        # empty categories must have the same dtype as the others, which
+        # is str rather than object in pandas 3.
+        empty = present[0].cat.categories[:0]
+        parts = []
+        for frame in frames:
+            if column in frame:
+                parts.append(frame[column])
+            else:
+                codes = np.full(len(frame), -1, dtype=np.int8)
+                parts.append(pd.Categorical.from_codes(codes, categories=empty))
+        df[column] = pd.api.types.union_categoricals(parts)
+
+    return df
+
+
 class GenericAlignRTClass:
     """The GenericAlignRTClass class is used to form the
     Patient, Site, Phase and Field subclasses.
@@ -75,6 +161,24 @@ class GenericAlignRTClass:
         "PatientTextureLuminosity",
     ]
 
+    # The conversions applied to details that are not strings
+    _type_converters = {
+        "DOB": _parse_dt,
+        "LatestApprovedSurfaceDateTimeStamp": _parse_dt,
+        "LatestApprovedRecordSurfaceTimestamp": _parse_dt,
+        "IsFromDicom": _to_bool,
+        "IsApproved": _to_bool,
+        "IsIsoCenterField": _to_bool,
+        "IsDynamicBeamType": _to_bool,
+        "LastUsedPlotterType": int,
+        "PatientTextureLuminosity": int,
+        "IsoRotValue": float,
+        "RepresentedCouchRotation": float,
+        "IsoXValue": float,
+        "IsoYValue": float,
+        "IsoZValue": float,
+    }
+
     # Methods
     def __init__(self, tree=None, parent=None):
         """
@@ -89,10 +193,15 @@ class GenericAlignRTClass:
         self.parent = parent
 
         if tree is not None:
-            # Create an object using the ElementTree provided
+            # Create an object using the ElementTree provided. The children
+            # are walked once, keeping the first of each tag as find() did,
+            # and the details are kept in the order of alignrt_data_tags.
+            children = {}
+            for child in tree:
+                children.setdefault(child.tag, child.text)
             for tag in GenericAlignRTClass.alignrt_data_tags:
-                if tree.find(tag) is not None:
-                    self.details[tag] = tree.find(tag).text
+                if tag in children:
+                    self.details[tag] = children[tag]
 
         self._perform_type_conversions()
 
@@ -144,74 +253,8 @@ class GenericAlignRTClass:
 
         """
 
-        # Convert Date of birth to datetime object
-        if "DOB" in self.details.keys():
-            self.details["DOB"] = dateutil.parser.parse(
-                self.details["DOB"], yearfirst=True
-            )
-
-        # Convert LatestApprovedSurfaceDateTimeStamp to datetime object
-        shorter_name = "LatestApprovedSurfaceDateTimeStamp"
-        if shorter_name in self.details.keys():
-            self.details[shorter_name] = dateutil.parser.parse(
-                self.details[shorter_name], yearfirst=True
-            )
-
-        # Convert LatestApprovedRecordSurfaceTimestamp to datetime object
-        shorter_name = "LatestApprovedRecordSurfaceTimestamp"
-        if shorter_name in self.details.keys():
-            self.details[shorter_name] = dateutil.parser.parse(
-                self.details[shorter_name], yearfirst=True
-            )
-
-        # Convert IsFromDicom to boolean
-        if "IsFromDicom" in self.details.keys():
-            if self.details["IsFromDicom"] == "true":
-                self.details["IsFromDicom"] = True
-            elif self.details["IsFromDicom"] == "false":
-                self.details["IsFromDicom"] = False
-
-        # Convert IsApproved to boolean
-        if "IsApproved" in self.details.keys():
-            if self.details["IsApproved"] == "true":
-                self.details["IsApproved"] = True
-            elif self.details["IsApproved"] == "false":
-                self.details["IsApproved"] = False
-
-        # Convert IsApproved to boolean
-        if "IsIsoCenterField" in self.details.keys():
-            if self.details["IsIsoCenterField"] == "true":
-                self.details["IsIsoCenterField"] = True
-            elif self.details["IsIsoCenterField"] == "false":
-                self.details["IsIsoCenterField"] = False
-
-        # Convert IsApproved to boolean
-        if "IsDynamicBeamType" in self.details.keys():
-            if self.details["IsDynamicBeamType"] == "true":
-                self.details["IsDynamicBeamType"] = True
-            elif self.details["IsDynamicBeamType"] == "false":
-                self.details["IsDynamicBeamType"] = False
-
-        # Perform conversions to int64
-        if "LastUsedPlotterType" in self.details.keys():
-            self.details["LastUsedPlotterType"] = np.int(
-                self.details["LastUsedPlotterType"]
-            )
-        if "PatientTextureLuminosity" in self.details.keys():
-            self.details["PatientTextureLuminosity"] = np.int(
-                self.details["PatientTextureLuminosity"]
-            )
-
-        # Perform conversions to float64
-        if "IsoRotValue" in self.details.keys():
-            self.details["IsoRotValue"] = np.float(self.details["IsoRotValue"])
-        if "RepresentedCouchRotation" in self.details.keys():
-            self.details["RepresentedCouchRotation"] = np.float(
-                self.details["RepresentedCouchRotation"]
-            )
-        if "IsoXValue" in self.details.keys():
-            self.details["IsoXValue"] = np.float(self.details["IsoXValue"])
-        if "IsoYValue" in self.details.keys():
-            self.details["IsoYValue"] = np.float(self.details["IsoYValue"])
-        if "IsoZValue" in self.details.keys():
-            self.details["IsoZValue"] = np.float(self.details["IsoZValue"])
+        # Convert each detail that is present using the converter table
+        for key, converter in GenericAlignRTClass._type_converters.items():
+            value = self.details.get(key)
+            if value is not None:
+                self.details[key] = converter(value)
@@ -21,20 +21,60 @@ with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 # Import helpful libraries
-import xml.etree.ElementTree as ET
+import os
+import threading
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from alignrt_tools.generic import GenericAlignRTClass
+from alignrt_tools.generic import (
+    GenericAlignRTClass,
+    _append_details,
+    _concat_frames,
+    _parse_dt,
+)
 from alignrt_tools.site import Site
 from alignrt_tools.surface import Surface
 from alignrt_tools.treatment import TreatmentCalendar
 from tqdm import tqdm
 import logging
-import dateutil
+
+# lxml parses the vpax files in C when it is installed. Otherwise, the
+# standard library ElementTree is used.
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# An lxml parser can be reused for many files, but not shared between
+# threads, so each thread that parses vpax files keeps its own
+_parser_local = threading.local()
+
+
+def _parse_vpax(vpax_path):
+    """Returns the root element of a .vpax file"""
+
+    if hasattr(ET, "LXML_VERSION"):
+        # Unlike ElementTree, lxml keeps comments and processing
+        # instructions as child elements, so drop them to keep them from
+        # being read as sites, phases or fields. External entities are not
+        # resolved and nothing is fetched over the network, so a crafted
+        # file cannot read local files or reach other hosts.
+        parser = getattr(_parser_local, "parser", None)
+        if parser is None:
+            parser = ET.XMLParser(
+                remove_comments=True,
+                remove_pis=True,
+                resolve_entities=False,
+                no_network=True,
+            )
+            _parser_local.parser = parser
+        return ET.parse(str(vpax_path), parser).getroot()
+
+    return ET.parse(vpax_path).getroot()
+
 
 class Patient(GenericAlignRTClass):
     """The Patient class contains attributes and methods that pertain
@@ -68,13 +108,13 @@ class Patient(GenericAlignRTClass):
 
         # if we have a path but not a patient, try to get a tree
         if tree is None and (patient_path is not None):
-            # Check to see if Patient Details.vpax is in the patient_path
-            if (patient_path / "Patient Details.vpax").is_file():
-                tree = ET.parse(patient_path / "Patient Details.vpax").getroot()
-
-            # Check to see if Patient_Details.vpax is in the patient_path
+            # Check to see if Patient_Details.vpax or Patient Details.vpax
+            # is in the patient_path. Only one is parsed, and
+            # Patient_Details.vpax is preferred if both are present.
             if (patient_path / "Patient_Details.vpax").is_file():
-                tree = ET.parse(patient_path / "Patient_Details.vpax").getroot()
+                tree = _parse_vpax(patient_path / "Patient_Details.vpax")
+            elif (patient_path / "Patient Details.vpax").is_file():
+                tree = _parse_vpax(patient_path / "Patient Details.vpax")
 
         # Instantiate the Patient using the generic class
         super().__init__(tree=tree, parent=parent)
@@ -82,6 +122,9 @@ class Patient(GenericAlignRTClass):
         self.patient_path = patient_path
         self.sites = []
 
+        # The TreatmentCalendar, built by get_treatment_calendar()
+        self._treatment_calendar = None
+
         # Create an array of sites for the patient
         if tree is not None:
 
@@ -96,7 +139,21 @@ class Patient(GenericAlignRTClass):
             r = Path(patient_path)
 
             # Get a list of the subdirectories in the path
-            folders = [item for item in r.iterdir() if item.is_dir()]
+            with os.scandir(r) as entries:
+                folders = [Path(entry.path) for entry in entries if entry.is_dir()]
+
+            # Index the fields by their site, phase and field descriptions,
+            # so that each surface can be matched with one lookup
+            field_index = {}
+            for site in self.sites:
+                for phase in site.phases:
+                    for field in phase.fields:
+                        key = (
+                            site.details["Description"],
+                            phase.details["Description"],
+                            field.details["Description"],
+                        )
+                        field_index.setdefault(key, []).append(field)
 
             # Determine if the folders are surfaces
             for folder in folders:
@@ -110,15 +167,11 @@ class Patient(GenericAlignRTClass):
                     ssd = temp_surface.site_details
 
                     # Identify the Site, Phase and Field for the surface
-                    for site in self.sites:
-                        if site.details["Description"] == ssd["Treatment Site"]:
-                            for phase in site.phases:
-                                if phase.details["Description"] == ssd["Phase"]:
-                                    for field in phase.fields:
-                                        if field.details["Description"] == ssd["Field"]:
-                                            # Append the surface to this field
-                                            temp_surface.parent = field
-                                            field.surfaces.append(temp_surface)
+                    key = (ssd.get("Treatment Site"), ssd["Phase"], ssd["Field"])
+                    for field in field_index.get(key, []):
+                        # Append the surface to this field
+                        temp_surface.parent = field
+                        field.surfaces.append(temp_surface)
 
     def get_realtimedeltas_as_dataframe(self):
         """
@@ -133,24 +186,19 @@ class Patient(GenericAlignRTClass):
         A dataframe containing all of the real-time deltas for this patient
 
         """
-        df = None
-
-        for site in self.sites:
-
-            if df is None:
-                df = site.get_realtimedeltas_as_dataframe()
-            else:
-                df = df.append(
-                    site.get_realtimedeltas_as_dataframe(), ignore_index=True
-                )
+        # Concatenate the real-time deltas of the sites in one step. The
+        # sites without real-time deltas return None and are skipped.
+        frames = [site.get_realtimedeltas_as_dataframe() for site in self.sites]
+        frames = [frame for frame in frames if frame is not None]
+        df = _concat_frames(frames) if frames else None
 
         # At this point, df may still yet be None
         # if this Patient does not have real-time deltas
         if df is not None:
-            # Append the field details
-            for key, value in self.details.items():
-                super_key = "Patient Details - " + key
-                df[super_key] = value
+            # Append the patient details. Strings are stored as
+            # categoricals, as they are for the surface details.
+            details = {"Patient Details - " + k: v for k, v in self.details.items()}
+            df = _append_details(df, details)
 
         return df
 
@@ -165,15 +213,18 @@ class Patient(GenericAlignRTClass):
         Returns
         -------
         A TreatmentCalendar object for this patient. It may be empty if
-        there are no real-time deltas for this patient.
+        there are no real-time deltas for this patient. The calendar is
+        built on the first call and the same object is returned by
+        later calls.
 
         """
-        df = self.get_realtimedeltas_as_dataframe()
+        if self._treatment_calendar is None:
+            df = self.get_realtimedeltas_as_dataframe()
 
-        if df is not None:
-            return TreatmentCalendar(df)
-        else:
-            return None
+            if df is not None:
+                self._treatment_calendar = TreatmentCalendar(df)
+
+        return self._treatment_calendar
 
     def __eq__(self, other):
         """
@@ -219,6 +270,9 @@ class PatientCollection:
     get_collection_as_dataframe()
         Returns the patient details as a pandas dataframe for all
         patients in the collection
+    get_index_dataframe()
+        Returns a flat index of the patients, sites, phases, fields
+        and surfaces in the collection
     """
 
     def __init__(self, alignrt_path_list=None):
@@ -232,6 +286,11 @@ class PatientCollection:
 
         self.patients = []
 
+        # Flat index of the patient tree, built by get_index_dataframe(),
+        # and the patients it was built from
+        self._index_df = None
+        self._index_patients = []
+
         if alignrt_path_list is not None:
 
             # Make sure alignrt_path_list is a list
@@ -261,16 +320,81 @@ class PatientCollection:
         A DataFrame containing the patient details for each patient
         """
 
-        # Create an empty dataframe
-        df = None
+        # Concatenate the details of all of the patients in one step
+        frames = [patient.get_details_as_dataframe() for patient in self.patients]
 
-        for patient in self.patients:
-            if df is None:
-                df = patient.get_details_as_dataframe()
-            else:
-                df = df.append(patient.get_details_as_dataframe(), ignore_index=True)
+        if frames:
+            return pd.concat(frames, ignore_index=True)
+        else:
+            return None
 
-        return df
+    def get_index_dataframe(self):
+        """
+        Returns a flat index of the patient tree, so that the patients,
+        sites, phases, fields and surfaces can be searched without
+        walking the tree. The index is built on the first call and
+        cached. It is rebuilt if patients have since been added to,
+        removed from or replaced in the patients list.
+
+        Each row holds the positions of one surface in the patients,
+        sites, phases, fields and surfaces lists (patient_idx, site_idx,
+        phase_idx, field_idx and surface_idx), along with the phase and
+        field descriptions and the surface's full name. Fields without
+        surfaces and phases without fields have a row with -1 in place
+        of the missing positions, so that every phase is included.
+
+        Returns
+        ----------
+        A DataFrame with one row per surface
+        """
+
+        # Compare the patients by identity, so that a reloaded patient
+        # also causes the index to be rebuilt
+        patients_changed = len(self.patients) != len(self._index_patients) or any(
+            px is not indexed_px
+            for px, indexed_px in zip(self.patients, self._index_patients)
+        )
+
+        if self._index_df is None or patients_changed:
+            self._index_patients = list(self.patients)
+            rows = []
+            for patient_idx, px in enumerate(self.patients):
+                for site_idx, sx in enumerate(px.sites):
+                    for phase_idx, phx in enumerate(sx.phases):
+                        # A phase without fields, or a field without
+                        # surfaces, gets one row with -1 positions
+                        fields = list(enumerate(phx.fields)) or [(-1, None)]
+                        for field_idx, fx in fields:
+                            surfaces = list(enumerate(fx.surfaces)) if fx else []
+                            for surface_idx, ux in surfaces or [(-1, None)]:
+                                rows.append(
+                                    (
+                                        patient_idx,
+                                        site_idx,
+                                        phase_idx,
+                                        field_idx,
+                                        surface_idx,
+                                        phx.details["Description"],
+                                        fx.details["Description"] if fx else None,
+                                        ux.surface_details["Full Name"] if ux else None,
+                                    )
+                                )
+
+            self._index_df = pd.DataFrame(
+                rows,
+                columns=[
+                    "patient_idx",
+                    "site_idx",
+                    "phase_idx",
+                    "field_idx",
+                    "surface_idx",
+                    "phase_desc",
+                    "field_desc",
+                    "surface_label",
+                ],
+            )
+
+        return self._index_df
 
     def get_filtered_patient_collection(
         self,
@@ -348,30 +472,51 @@ class PatientCollection:
             r = Path(alignrt_path)
 
             # Get a list of the subdirectories in the path
-            folders = [item for item in r.iterdir() if item.is_dir()]
+            with os.scandir(r) as entries:
+                folders = [Path(entry.path) for entry in entries if entry.is_dir()]
+
+            # The patient folders are independent, and reading them is
+            # dominated by file access, so read them in a thread pool.
+            # map() returns the patients in folder order.
+            with ThreadPoolExecutor() as executor:
+                for patients in tqdm(
+                    executor.map(self._create_patients_from_folder, folders),
+                    total=len(folders),
+                    desc="Patient Folders",
+                ):
+                    self.patients.extend(patients)
 
-            for folder in tqdm(folders, desc="Patient Folders"):
-
-                # Check to see if Patient Details.vpax is in the folder
-                if (folder / "Patient Details.vpax").is_file():
-                    self.patients.append(
-                        Patient(
-                            tree=ET.parse(folder / "Patient Details.vpax").getroot(),
-                            patient_path=folder,
-                        )
-                    )
-
-                # Check to see if Patient_Details.vpax is in the folder
-                if (folder / "Patient_Details.vpax").is_file():
-                    self.patients.append(
-                        Patient(
-                            tree=ET.parse(folder / "Patient_Details.vpax").getroot(),
-                            patient_path=folder,
-                        )
-                    )
+            # The patients have changed, so the index must be rebuilt
+            self._index_df = None
 
             dir_count = dir_count + 1
 
+    @staticmethod
+    def _create_patients_from_folder(folder):
+        # Returns a list of the patients created from the .vpax files
+        # in folder, which is empty if folder is not a patient folder
+        patients = []
+
+        # Check to see if Patient Details.vpax is in the folder
+        if (folder / "Patient Details.vpax").is_file():
+            patients.append(
+                Patient(
+                    tree=_parse_vpax(folder / "Patient Details.vpax"),
+                    patient_path=folder,
+                )
+            )
+
+        # Check to see if Patient_Details.vpax is in the folder
+        if (folder / "Patient_Details.vpax").is_file():
+            patients.append(
+                Patient(
+                    tree=_parse_vpax(folder / "Patient_Details.vpax"),
+                    patient_path=folder,
+                )
+            )
+
+        return patients
+
     @staticmethod
     def _string_to_list(string_or_list):
 
@@ -408,7 +553,8 @@ def get_patient_list(alignrt_path_list):
 
     for alignrt_path in alignrt_path_list:
         r = Path(alignrt_path)
-        folders = [item for item in r.iterdir() if item.is_dir()]
+        with os.scandir(r) as entries:
+            folders = [Path(entry.path) for entry in entries if entry.is_dir()]
 
         xml_data = None
 
@@ -416,11 +562,11 @@ def get_patient_list(alignrt_path_list):
             if (folder / "Patient Details.vpax").is_file():
                 file_path = folder / "Patient Details.vpax"
                 logger.debug(f"{file_path.resolve()} exists")
-                xml_data = ET.parse(file_path).getroot()
+                xml_data = _parse_vpax(file_path)
             elif (folder / "Patient_Details.vpax").is_file():
                 file_path = folder / "Patient_Details.vpax"
                 logger.debug(f"{file_path.resolve()} exists")
-                xml_data = ET.parse(file_path).getroot()
+                xml_data = _parse_vpax(file_path)
             else:
                 logger.debug(f"{folder.resolve()} is not a patient folder")
 
@@ -432,9 +578,7 @@ def get_patient_list(alignrt_path_list):
                     latest_surface = xml_data.find(
                         "LatestApprovedRecordSurfaceTimestamp"
                     ).text
-                    latest_surface = dateutil.parser.parse(
-                        latest_surface, yearfirst=True
-                    )
+                    latest_surface = _parse_dt(latest_surface)
                 except:
                     latest_surface = ""
                 patient_list.append((last_name, first_name, mrn, latest_surface))
@@ -17,7 +17,7 @@ You should have received a copy of the GNU General Public License along with
 this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-from alignrt_tools.generic import GenericAlignRTClass
+from alignrt_tools.generic import GenericAlignRTClass, _append_details, _concat_frames
 from alignrt_tools.field import Field
 
 
@@ -71,23 +71,17 @@ class Phase(GenericAlignRTClass):
         A dataframe containing all of the real-time deltas for this phase
 
         """
-        df = None
-
-        for field in self.fields:
-
-            if df is None:
-                df = field.get_realtimedeltas_as_dataframe()
-            else:
-                df = df.append(
-                    field.get_realtimedeltas_as_dataframe(), ignore_index=True
-                )
+        # Concatenate the real-time deltas of the fields in one step. The
+        # fields without real-time deltas return None and are skipped.
+        frames = [field.get_realtimedeltas_as_dataframe() for field in self.fields]
+        frames = [frame for frame in frames if frame is not None]
+        df = _concat_frames(frames) if frames else None
 
         # At this point, df may still yet be None
         # if this Phase does not have real-time deltas
         if df is not None:
-            # Append the phase details
-            for key, value in self.details.items():
-                super_key = "Phase Details - " + key
-                df[super_key] = value
+            # Append the phase details in one call
+            details = {"Phase Details - " + k: v for k, v in self.details.items()}
+            df = _append_details(df, details)
 
         return df
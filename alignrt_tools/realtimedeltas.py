@@ -45,9 +45,12 @@ def convert_realtimedelta_file_to_dataframe(
 
     df = pd.read_csv(rtd_filename)
 
-    # Process strings to datetimes
+    # Process strings to datetimes. The file repeats many timestamps, so
+    # let pandas parse each unique string only once.
     format_str = "%d-%m-%y %I:%M:%S.%f %p"
-    df["Date Time (ms)"] = pd.to_datetime(df["Date Time (ms)"], format=format_str)
+    df["Date Time (ms)"] = pd.to_datetime(
+        df["Date Time (ms)"], format=format_str, cache=True
+    )
 
     # Convert columns to category data type to reduce memory usage.
     df["Patient ID(GUID)"] = df["Patient ID(GUID)"].astype("category")
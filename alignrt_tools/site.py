@@ -18,7 +18,7 @@ You should have received a copy of the GNU General Public License along with
 this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-from alignrt_tools.generic import GenericAlignRTClass
+from alignrt_tools.generic import GenericAlignRTClass, _append_details, _concat_frames
 from alignrt_tools.phase import Phase
 
 
@@ -72,23 +72,17 @@ class Site(GenericAlignRTClass):
         A dataframe containing all of the real-time deltas for this site
 
         """
-        df = None
-
-        for phase in self.phases:
-
-            if df is None:
-                df = phase.get_realtimedeltas_as_dataframe()
-            else:
-                df = df.append(
-                    phase.get_realtimedeltas_as_dataframe(), ignore_index=True
-                )
+        # Concatenate the real-time deltas of the phases in one step. The
+        # phases without real-time deltas return None and are skipped.
+        frames = [phase.get_realtimedeltas_as_dataframe() for phase in self.phases]
+        frames = [frame for frame in frames if frame is not None]
+        df = _concat_frames(frames) if frames else None
 
         # At this point, df may still yet be None
         # if this Site does not have real-time deltas
         if df is not None:
-            # Append the site details
-            for key, value in self.details.items():
-                super_key = "Site Details - " + key
-                df[super_key] = value
+            # Append the site details in one call
+            details = {"Site Details - " + k: v for k, v in self.details.items()}
+            df = _append_details(df, details)
 
         return df
@@ -1,6 +1,14 @@
 """A module for working with AlignRT surface data"""
 
 # Import helpful libraries
+import functools
+import io
+import itertools
+import math
+import mmap
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
@@ -11,6 +19,269 @@ except:
     print("open3d could not be opened")
 import pandas as pd
 import numpy as np
+from alignrt_tools.generic import _append_details, _concat_frames
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import pyarrow
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa_csv = None
+
+# A real-time delta file starts with a header of "Key:, Value" lines
+_RTD_HEADER_LINES = 11
+_RTD_HEADER_RE = re.compile(r"(?m)^([^:\r\n]+):, ?([^\r\n\x00]*)")
+
+# Matches a Key=Value line in capture.ini or site.ini
+_INI_RE = re.compile(r"(?m)^([^=\n]+)=([^\n]*)$")
+
+# Matches a face in the v1//n1 v2//n2 v3//n3 layout that AlignRT writes,
+# and everything after the vertex index in a face element of any layout,
+# such as the /2/3 of 1/2/3
+_OBJ_ALIGNRT_FACE_RE = re.compile(rb"\s*\d+//\d+\s+\d+//\d+\s+\d+//\d+\s*")
+_OBJ_FACE_SUFFIX_RE = re.compile(rb"/\S*")
+
+# Real-time deltas are stored in folders named Monitoring_DATE_TIME
+_MONITORING_PREFIX = "Monitoring_"
+
+# Column types for the real-time delta files, so that read_csv does not
+# have to infer them. float32 holds the deltas well beyond their
+# measurement precision, but Elapsed Time stays float64 so that the
+# Clock Time keeps sub-millisecond resolution over long sessions.
+# XRayState is read as a float so that the missing values of a row cut
+# short by an interrupted export are kept as NaN.
+_RTD_DTYPES = {
+    "Elapsed Time (sec)": np.float64,
+    " D.VRT (cm)": np.float32,
+    " D.LAT (cm)": np.float32,
+    " D.LNG (cm)": np.float32,
+    " D.VRT (mm)": np.float32,
+    " D.LAT (mm)": np.float32,
+    " D.LNG (mm)": np.float32,
+    " D.Rtn (deg)": np.float32,
+    " D.Roll (deg)": np.float32,
+    " D.Pitch (deg)": np.float32,
+    " XRayState": np.float32,
+}
+
+# The same columns with the deltas kept in float64, for Surfaces
+# created with use_float32=False
+_RTD_DTYPES_FLOAT64 = {
+    column: np.float64 if dtype is np.float32 else dtype
+    for column, dtype in _RTD_DTYPES.items()
+}
+
+if pa_csv is not None:
+    _RTD_CONVERT_OPTIONS = {
+        use_float32: pa_csv.ConvertOptions(
+            column_types={c: pyarrow.from_numpy_dtype(t) for c, t in dtypes.items()}
+        )
+        for use_float32, dtypes in ((True, _RTD_DTYPES), (False, _RTD_DTYPES_FLOAT64))
+    }
+    _RTD_READ_OPTIONS = pa_csv.ReadOptions(skip_rows=_RTD_HEADER_LINES)
+
+# Real-time delta files with more rows than this have their magnitude
+# computed by a compiled kernel when numba is installed. Smaller files
+# are not worth the JIT overhead.
+_NUMBA_MIN_ROWS = 10_000
+
+# obj files larger than this are parsed by compiled kernels when numba
+# is installed
+_NUMBA_MIN_OBJ_BYTES = 1_000_000
+
+if numba is not None:
+
+    # The kernel is serial, so that it is safe to call from the threads
+    # that read RTD files. It releases the GIL while it runs.
+    @numba.njit(fastmath=True, nogil=True, cache=True)
+    def _magnitude_kernel(vrt, lat, lng, out):
+        for i in range(vrt.shape[0]):
+            out[i] = math.sqrt(vrt[i] * vrt[i] + lat[i] * lat[i] + lng[i] * lng[i])
+
+    # The obj kernels below walk the raw bytes of the file. Characters
+    # are compared by their ASCII codes: 9 tab, 10 newline, 32 space,
+    # 43 "+", 45 "-", 46 ".", 48-57 digits, 69 "E", 101 "e", 102 "f",
+    # 110 "n", 112 "p", 115 "s" and 118 "v". As in the pandas parser, a
+    # line's keyword must be followed by a space.
+
+    @numba.njit(cache=True)
+    def _skip_obj_line(data, i):
+        # Returns the index of the start of the next line
+        while i < data.shape[0] and data[i] != 10:
+            i += 1
+        return i + 1
+
+    @numba.njit(cache=True)
+    def _parse_obj_int(data, i):
+        # Parses the integer after any spaces at data[i], then skips the
+        # rest of the element (such as the //n of a face). Returns the
+        # value and the index after the element.
+        n = data.shape[0]
+        while i < n and (data[i] == 32 or data[i] == 9):
+            i += 1
+        value = 0
+        while i < n and 48 <= data[i] <= 57:
+            value = value * 10 + (data[i] - 48)
+            i += 1
+        while i < n and data[i] != 32 and data[i] != 9 and data[i] != 10:
+            i += 1
+        return value, i
+
+    @numba.njit(cache=True)
+    def _parse_obj_float(data, i):
+        # Parses the decimal number after any spaces at data[i]. Returns
+        # the value and the index after the number.
+        n = data.shape[0]
+        while i < n and (data[i] == 32 or data[i] == 9):
+            i += 1
+
+        sign = 1.0
+        if i < n and (data[i] == 45 or data[i] == 43):
+            if data[i] == 45:
+                sign = -1.0
+            i += 1
+
+        # Collect the significant digits as an integer and a power of 10,
+        # dropping digits that would overflow the integer
+        mantissa = 0
+        exponent = 0
+        while i < n and 48 <= data[i] <= 57:
+            if mantissa < 100_000_000_000_000_000:
+                mantissa = mantissa * 10 + (data[i] - 48)
+            else:
+                exponent += 1
+            i += 1
+        if i < n and data[i] == 46:
+            i += 1
+            while i < n and 48 <= data[i] <= 57:
+                if mantissa < 100_000_000_000_000_000:
+                    mantissa = mantissa * 10 + (data[i] - 48)
+                    exponent -= 1
+                i += 1
+        if i < n and (data[i] == 101 or data[i] == 69):
+            i += 1
+            exponent_sign = 1
+            if i < n and (data[i] == 45 or data[i] == 43):
+                if data[i] == 45:
+                    exponent_sign = -1
+                i += 1
+            power = 0
+            while i < n and 48 <= data[i] <= 57:
+                power = power * 10 + (data[i] - 48)
+                i += 1
+            exponent += exponent_sign * power
+
+        # Dividing by an exact power of 10 keeps the result correctly
+        # rounded for the short decimals found in obj files
+        if exponent >= 0:
+            return sign * mantissa * 10.0 ** exponent, i
+        return sign * mantissa / 10.0 ** -exponent, i
+
+    @numba.njit(cache=True)
+    def _count_obj_elements(data):
+        # Returns the number of v, vn and f lines, followed by the ps and
+        # fs header values (or -1 if they are missing)
+        n = data.shape[0]
+        num_v = 0
+        num_vn = 0
+        num_f = 0
+        ps = -1
+        fs = -1
+        i = 0
+        while i < n:
+            c0 = data[i]
+            c1 = data[i + 1] if i + 1 < n else 0
+            c2 = data[i + 2] if i + 2 < n else 0
+            if c0 == 118 and c1 == 32:
+                num_v += 1
+            elif c0 == 118 and c1 == 110 and c2 == 32:
+                num_vn += 1
+            elif c0 == 102 and c1 == 32:
+                num_f += 1
+            elif c0 == 112 and c1 == 115 and c2 == 32:
+                ps, i = _parse_obj_int(data, i + 2)
+            elif c0 == 102 and c1 == 115 and c2 == 32:
+                fs, i = _parse_obj_int(data, i + 2)
+            i = _skip_obj_line(data, i)
+        return num_v, num_vn, num_f, ps, fs
+
+    @numba.njit(cache=True)
+    def _fill_obj_arrays(data, vertices, normals, faces):
+        # Fills the preallocated arrays from the v, vn and f lines. The
+        # face indices are converted to start at 0.
+        n = data.shape[0]
+        i_v = 0
+        i_vn = 0
+        i_f = 0
+        i = 0
+        while i < n:
+            c0 = data[i]
+            c1 = data[i + 1] if i + 1 < n else 0
+            c2 = data[i + 2] if i + 2 < n else 0
+            if c0 == 118 and c1 == 32:
+                i += 2
+                for k in range(3):
+                    value, i = _parse_obj_float(data, i)
+                    vertices[i_v, k] = value
+                i_v += 1
+            elif c0 == 118 and c1 == 110 and c2 == 32:
+                i += 3
+                for k in range(3):
+                    value, i = _parse_obj_float(data, i)
+                    normals[i_vn, k] = value
+                i_vn += 1
+            elif c0 == 102 and c1 == 32:
+                i += 2
+                for k in range(3):
+                    index, i = _parse_obj_int(data, i)
+                    faces[i_f, k] = index - 1
+                i_f += 1
+            i = _skip_obj_line(data, i)
+
+
+def _read_ini(ini_path):
+    """Returns the Key=Value pairs with non-empty values in an AlignRT
+    .ini file as a dictionary"""
+
+    with open(ini_path, "r", encoding="latin-1") as ini:
+        return {key: value for key, value in _INI_RE.findall(ini.read()) if value}
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_alignrt_time(time_str):
+    """Converts an AlignRT timestamp to a datetime.
+
+    AlignRT writes its timestamps in fixed formats: YYMMDD HHMMSS for
+    surface folder names and YYMMDD_HHMMSS.fff in real-time delta
+    headers. The fields are sliced out directly, which is much faster
+    than strptime. Any fraction of a second is dropped. Two-digit years
+    follow strptime's %y, so 69 to 99 are 1969 to 1999 and 00 to 68 are
+    2000 to 2068. The results are cached, since the same timestamps are
+    parsed again whenever a surface is reloaded."""
+
+    if (
+        len(time_str) < 13
+        or time_str[6] not in " _"
+        or not (time_str[:6] + time_str[7:13]).isdigit()
+        or (len(time_str) > 13 and time_str[13] != ".")
+    ):
+        raise ValueError("Invalid AlignRT timestamp: {!r}".format(time_str))
+
+    year = int(time_str[0:2])
+    year += 1900 if year >= 69 else 2000
+
+    return datetime(
+        year,
+        int(time_str[2:4]),
+        int(time_str[4:6]),
+        int(time_str[7:9]),
+        int(time_str[9:11]),
+        int(time_str[11:13]),
+    )
 
 
 class Surface:
@@ -26,6 +297,9 @@ class Surface:
     load_rtds : bool
         determines whether the real-time deltas are loaded into a
         dataframe during initialization (default is False)
+    use_float32 : bool
+        determines whether the real-time deltas are read as float32,
+        which halves their memory, or as float64 (default is True)
 
     Attributes
     ----------
@@ -35,6 +309,10 @@ class Surface:
         Data from the capture.ini file stored in a dictionary
     site_details : dict
         Data from the site.ini file stored in a dictionary
+    parent : Field
+        The Field to which this surface belongs, if known
+    use_float32 : bool
+        Whether the real-time deltas are read as float32
 
     Notes
     -----
@@ -42,47 +320,52 @@ class Surface:
     None during initialization to reduce memory overhead and loading
     time. Please access these objects through the associated methods
     called get_realtimedeltas_as_dataframe() and get_surface_mesh()
+
+    Use Surface.open() instead of the constructor when the same surface
+    directory may be visited more than once; it returns a cached Surface
+    as long as neither capture.ini nor the real-time deltas have been
+    modified.
     """
 
-    def __init__(self, surface_path, load_rtds=False, parent=None):
+    # Many Surface objects may be alive at once, so avoid a per-instance
+    # __dict__. The details stay in dicts because the ini keys vary.
+    __slots__ = (
+        "surface_path",
+        "surface_details",
+        "site_details",
+        "parent",
+        "use_float32",
+        "_surface_mesh",
+        "_realtimedeltas",
+    )
+
+    def __init__(self, surface_path, load_rtds=False, parent=None, use_float32=True):
 
         self.surface_path = surface_path
-        self.surface_details = {}
-        self.site_details = {}
+        self.parent = parent
+        self.use_float32 = use_float32
         self._surface_mesh = None
         self._realtimedeltas = None
 
         # Create a Path object from alignrt_path
         r = Path(surface_path)
 
-        # Read capture.ini and convert to dictionary
-        with open((r / "capture.ini"), "r", encoding="latin-1") as capt_ini:
-            for line in capt_ini:
-                pieces = line.split("=")
-                if len(pieces) > 1:
-                    if pieces[1].split("\n")[0] != "":
-                        self.surface_details[pieces[0]] = pieces[1].split("\n")[0]
-
-        # Read site.ini and convert to dictionary
-        with open((r / "site.ini"), "r", encoding="latin-1") as site_ini:
-            for line in site_ini:
-                pieces = line.split("=")
-                if len(pieces) > 1:
-                    if pieces[1].split("\n")[0] != "":
-                        self.site_details[pieces[0]] = pieces[1].split("\n")[0]
-
-            # In site.ini, the Phase and Field have surrounding
-            # quotes that get included in the dictionary values.
-            # This can complicate the matching process.
-            # Let's remove them
-            self.site_details["Phase"] = self.site_details["Phase"][1:-1]
-            self.site_details["Field"] = self.site_details["Field"][1:-1]
+        # Read capture.ini and site.ini into dictionaries
+        self.surface_details = _read_ini(r / "capture.ini")
+        self.site_details = _read_ini(r / "site.ini")
+
+        # In site.ini, the Phase and Field have surrounding
+        # quotes that get included in the dictionary values.
+        # This can complicate the matching process.
+        # Let's remove them
+        self.site_details["Phase"] = self.site_details["Phase"].strip('"')
+        self.site_details["Field"] = self.site_details["Field"].strip('"')
 
         if load_rtds:
             self._load_rtds_as_dataframe()
 
         # Add the creation date-time to the surface_details
-        self.surface_details["Created"] = datetime.strptime(r.name, "%y%m%d %H%M%S")
+        self.surface_details["Created"] = _parse_alignrt_time(r.name)
 
         # Create a full name for the surface based on the "Field", "Label Prefix" and time-stamp
         self.surface_details["Full Name"] = "{} {} {}".format(
@@ -91,6 +374,61 @@ class Surface:
             self.surface_details["Created"],
         )
 
+    @classmethod
+    def open(cls, surface_path, use_float32=True):
+        """
+        Returns a cached Surface for surface_path, creating it if needed
+
+        Parameters
+        ----------
+        surface_path : str
+            the path to the directory which contains the surface files
+        use_float32 : bool
+            determines whether the real-time deltas are read as float32
+            (default is True)
+
+        Returns
+        -------
+        A Surface object. The same object is returned for repeated calls
+        until capture.ini is modified, a Monitoring folder is added or
+        removed, or a RealTimeDeltas file is added, removed or written
+        to. Only the most recently opened surfaces are kept, since each
+        may hold its real-time deltas and mesh.
+
+        """
+
+        # Spellings of the same directory, such as a Path and a relative
+        # str, share one cache entry
+        path_str = os.path.abspath(os.fspath(surface_path))
+        ini_mtime = os.stat(os.path.join(path_str, "capture.ini")).st_mtime_ns
+
+        # Each RealTimeDeltas file is identified by its modification time
+        # and size, so that a file that is appended to is read again
+        rtd_stats = []
+        with os.scandir(path_str) as entries:
+            for entry in entries:
+                if entry.name.startswith(_MONITORING_PREFIX) and entry.is_dir():
+                    date_time_str = entry.name[len(_MONITORING_PREFIX) :]
+                    rtd_path = os.path.join(
+                        entry.path, "RealTimeDeltas_{}.txt".format(date_time_str)
+                    )
+                    try:
+                        stat = os.stat(rtd_path)
+                        rtd_stats.append((entry.name, stat.st_mtime_ns, stat.st_size))
+                    except FileNotFoundError:
+                        rtd_stats.append((entry.name, None, None))
+        rtd_stats = tuple(sorted(rtd_stats))
+
+        return cls._cached(path_str, ini_mtime, rtd_stats, use_float32)
+
+    @classmethod
+    @functools.lru_cache(maxsize=32)
+    def _cached(cls, path_str, ini_mtime, rtd_stats, use_float32):
+        # The file stats are only part of the cache key, so that a
+        # rewritten capture.ini or new real-time deltas produce a new
+        # Surface
+        return cls(path_str, use_float32=use_float32)
+
     def get_surface_details_as_dataframe(self):
         """
         Returns the surface details dictionary as a dataframe item
@@ -157,16 +495,17 @@ class Surface:
 
         # After _load_rtds_as_dataframe(), the _realtimedeltas may
         # still be None if this surface does not have real-time deltas
-        if self._realtimedeltas is not None:
-            # Append the site details and surface details
-            for key, value in self.site_details.items():
-                super_key = "site.ini details - " + key
-                self._realtimedeltas[super_key] = value
-            for key, value in self.surface_details.items():
-                super_key = "Surface Details - " + key
-                self._realtimedeltas[super_key] = value
+        if self._realtimedeltas is None:
+            return None
 
-        return self._realtimedeltas
+        # Append the site details and surface details in one call. The
+        # stored real-time deltas keep only the per-row data.
+        details = {"site.ini details - " + k: v for k, v in self.site_details.items()}
+        details.update(
+            {"Surface Details - " + k: v for k, v in self.surface_details.items()}
+        )
+
+        return _append_details(self._realtimedeltas, details)
 
     def get_surface_mesh(self):
         """Returns an open3d.TriangleMesh containing the
@@ -195,17 +534,16 @@ class Surface:
         # Verify that the collection is empty
         if self._realtimedeltas is None:
 
-            # Set df to None
-            df = None
-
             # Create a Path object from surface_path
             r = Path(self.surface_path)
 
             # Get a list of the subdirectories in the path
-            folders = [item for item in r.iterdir() if item.is_dir()]
+            with os.scandir(r) as entries:
+                folders = [Path(entry.path) for entry in entries if entry.is_dir()]
 
             # Determine if any of the folders contain
             # RealTimeDeltas_DATE_TIME.txt files
+            rtd_paths = []
             for folder in folders:
                 """
                 The name of a RealTimeDeltas folder is
@@ -215,144 +553,118 @@ class Surface:
                 """
 
                 # Check to see if this a monitoring folder
-                if folder.name[0:10] == "Monitoring":
+                if folder.name.startswith(_MONITORING_PREFIX):
 
                     # Construct the likely RealTimeDeltas file path
-                    date_time_str = folder.name.split("Monitoring_")[1]
+                    date_time_str = folder.name[len(_MONITORING_PREFIX) :]
                     rtd_path = folder / "RealTimeDeltas_{}.txt".format(date_time_str)
 
                     # Determine if the file exists
                     if rtd_path.is_file():
+                        rtd_paths.append(rtd_path)
+
+            # Read the files in parallel. Most of the work is file I/O and
+            # the pandas C parser, both of which release the GIL.
+            parse_one_rtd = functools.partial(
+                Surface._parse_one_rtd, use_float32=self.use_float32
+            )
+            if len(rtd_paths) > 1:
+                workers = min(len(rtd_paths), os.cpu_count() or 1)
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    frames = list(executor.map(parse_one_rtd, rtd_paths))
+            else:
+                frames = [parse_one_rtd(rtd_path) for rtd_path in rtd_paths]
+
+            # Combine the real time deltas into a single dataframe
+            if frames:
+                df = _concat_frames(frames)
+
+                # Add a column for magnitude, ahead of the Clock Time. It is
+                # computed here rather than in the reader threads, so the
+                # compiled kernel only ever runs on the calling thread.
+                df.insert(
+                    df.columns.get_loc("Clock Time"),
+                    " D.MAG (cm)",
+                    Surface._magnitude(df),
+                )
+                self._realtimedeltas = df
+
+    @staticmethod
+    def _magnitude(df):
+        # Returns the magnitude of the VRT, LAT and LNG deltas in df
+        if numba is not None and len(df) > _NUMBA_MIN_ROWS:
+            vrt = df[" D.VRT (cm)"].to_numpy()
+            magnitude = np.empty_like(vrt)
+            _magnitude_kernel(
+                vrt,
+                df[" D.LAT (cm)"].to_numpy(),
+                df[" D.LNG (cm)"].to_numpy(),
+                magnitude,
+            )
+            return magnitude
+
+        deltas = df[[" D.VRT (cm)", " D.LAT (cm)", " D.LNG (cm)"]].to_numpy()
+        return np.sqrt(np.einsum("ij,ij->i", deltas, deltas))
 
-                        # Read the real-time deltas header
-                        rtd_details = {}
-                        with open(rtd_path, "r") as rtd:
-                            header_lines = rtd.readlines()[0:11]
-
-                            for line in header_lines:
-                                pieces = line.split(":, ")
-                                if len(pieces) > 1:
-                                    rtd_details[pieces[0]] = (
-                                        pieces[1].split("\n")[0].split("\x00")[0]
-                                    )
-                                else:
-                                    rtd_details[pieces[0]] = None
-
-                        # Change Start Time and End Time to datetime objects
-                        rtd_details["Start Time"] = datetime.strptime(
-                            rtd_details["Start Time"].split(".")[0], "%y%m%d_%H%M%S"
-                        )
-                        rtd_details["End Time"] = datetime.strptime(
-                            rtd_details["End Time"].split(".")[0], "%y%m%d_%H%M%S"
-                        )
-
-                        # Next, open the rest of a the file as a dataframe
-                        temp_df = pd.read_csv(rtd_path, header=11)
-
-                        # Some early patient may have deltas in mm. Convert to cm.
-                        if " D.VRT (mm)" in temp_df:
-                            temp_df[" D.VRT (cm)"] = temp_df[" D.VRT (mm)"] / 10.0
-                        if " D.LAT (mm)" in temp_df:
-                            temp_df[" D.LAT (cm)"] = temp_df[" D.LAT (mm)"] / 10.0
-                        if " D.VRT (mm)" in temp_df:
-                            temp_df[" D.LNG (cm)"] = temp_df[" D.LNG (mm)"] / 10.0
-
-                        # Add a column for magnitude
-
-                        temp_df[" D.MAG (cm)"] = (
-                            temp_df[" D.VRT (cm)"] * temp_df[" D.VRT (cm)"]
-                            + temp_df[" D.LAT (cm)"] * temp_df[" D.LAT (cm)"]
-                            + temp_df[" D.LNG (cm)"] * temp_df[" D.LNG (cm)"]
-                        )
-                        temp_df[" D.MAG (cm)"] = temp_df[" D.MAG (cm)"].apply(np.sqrt)
-
-                        # Add a column for the Clock Time
-                        start_time = rtd_details["Start Time"]
-                        elapsed_time = pd.to_timedelta(
-                            temp_df["Elapsed Time (sec)"], "s"
-                        )
-                        temp_df["Clock Time"] = start_time + elapsed_time
-
-                        # Add the rtd_details to the dataframe
-                        for key, value in rtd_details.items():
-                            temp_df[key] = value
-
-                        # Append values to the real time deltas dataframe
-                        if df is None:
-                            df = temp_df
-                        else:
-                            df = df.append(temp_df, ignore_index=True)
-
-            self._realtimedeltas = df
+    @staticmethod
+    def _parse_one_rtd(rtd_path, use_float32=True):
+        """Returns the contents of a RealTimeDeltas_DATE_TIME.txt file as
+        a dataframe, with the header details added as columns"""
+
+        # Read the real-time deltas header
+        with open(rtd_path, "rb") as rtd:
+            header = b"".join(itertools.islice(rtd, _RTD_HEADER_LINES))
+        rtd_details = dict(_RTD_HEADER_RE.findall(header.decode("latin-1")))
+
+        # Change Start Time and End Time to datetime objects
+        rtd_details["Start Time"] = _parse_alignrt_time(rtd_details["Start Time"])
+        rtd_details["End Time"] = _parse_alignrt_time(rtd_details["End Time"])
+
+        # Next, open the rest of a the file as a dataframe. pyarrow's reader
+        # is multithreaded and about twice as fast as pandas when installed.
+        # It rejects a file whose last row was cut short, which pandas reads
+        # with the missing values as NaN, so such files are left to pandas.
+        temp_df = None
+        if pa_csv is not None:
+            try:
+                temp_df = pa_csv.read_csv(
+                    rtd_path,
+                    read_options=_RTD_READ_OPTIONS,
+                    convert_options=_RTD_CONVERT_OPTIONS[use_float32],
+                ).to_pandas()
+            except pyarrow.ArrowInvalid:
+                pass
+        if temp_df is None:
+            temp_df = pd.read_csv(
+                rtd_path,
+                header=_RTD_HEADER_LINES,
+                dtype=_RTD_DTYPES if use_float32 else _RTD_DTYPES_FLOAT64,
+                engine="c",
+                memory_map=True,
+                low_memory=False,
+            )
+
+        # Some early patient may have deltas in mm. Convert to cm.
+        for axis in ("VRT", "LAT", "LNG"):
+            if f" D.{axis} (mm)" in temp_df:
+                mm = temp_df[f" D.{axis} (mm)"].to_numpy()
+                temp_df[f" D.{axis} (cm)"] = mm / 10.0
+
+        # Add a column for the Clock Time, computed in integer nanoseconds
+        start_ns = pd.Timestamp(rtd_details["Start Time"]).value
+        elapsed_sec = temp_df["Elapsed Time (sec)"].to_numpy()
+        elapsed_ns = np.round(elapsed_sec * 1e9).astype(np.int64)
+        temp_df["Clock Time"] = (start_ns + elapsed_ns).view("datetime64[ns]")
+
+        # Add the rtd_details to the dataframe in one pass
+        temp_df = _append_details(temp_df, rtd_details)
+
+        return temp_df
 
     @staticmethod
     def _obj_to_open3d(obj_file, roi_file, tfm_file):
 
-        # Scan file for ps, fs for array pre-allocation
-        found_ps = False
-        found_fs = False
-        ps = 0
-        fs = 0
-
-        with open(obj_file) as obj:
-            while not (found_ps and found_fs):
-                elements = obj.readline().split()
-
-                if len(elements) > 0:
-
-                    if elements[0] == "ps":
-                        found_ps = True
-                        ps = int(elements[1])
-
-                    if elements[0] == "fs":
-                        found_fs = True
-                        fs = int(elements[1])
-
-        # Preallocate arrays
-        vertices = np.zeros((ps, 3)).astype(np.float32)
-        normals = np.zeros((ps, 3)).astype(np.float32)
-        faces = np.zeros((fs, 3)).astype(np.int32)
-
-        # indices for filling the arrays
-        ind_v = 0
-        ind_n = 0
-        ind_f = 0
-
-        # fill the arrays
-        with open(obj_file) as obj:
-            for line in obj.readlines():
-                elements = line.split()
-
-                if len(elements) > 0:
-
-                    if elements[0] == "v":
-                        n = np.array(elements[1:], np.float64)
-                        vertices[ind_v, :] = n
-                        ind_v += 1
-
-                    if elements[0] == "vn":
-                        n = np.array(elements[1:], np.float64)
-                        normals[ind_n, :] = n
-                        ind_n += 1
-
-                    if elements[0] == "f":
-                        f = [int(e.split("//")[0]) for e in elements[1:]]
-                        n = np.array(f, np.float)
-                        # obj face indices start at 1, ply at 0
-                        # Using (n-1) converts between conventions
-                        faces[ind_f, :] = n - 1
-                        ind_f += 1
-
-        # Verify they are full
-        assert (
-            ps == ind_v
-        ), f"The final vertex array index {ind_v-1} does not equal ps {ps}"
-        assert (
-            ps == ind_n
-        ), f"The final normal array index {ind_v-1} does not equal ps {ps}"
-        assert (
-            fs == ind_f
-        ), f"The final face array index {ind_f-1} does not equal fs {fs}"
+        vertices, normals, faces = Surface._read_obj(obj_file)
 
         # Pass matricies to Open3D.TriangleMesh() and visualize
         ply = TriangleMesh()
@@ -360,13 +672,113 @@ class Surface:
         ply.vertex_normals = Vector3dVector(normals)
         ply.triangles = Vector3iVector(faces)
 
-        # Open the transformation matrix
-        tfm = np.loadtxt(tfm_file, dtype=float, delimiter="\t")
+        # Open the transformation matrix. It is a small tab-delimited
+        # 4x4 matrix, so np.loadtxt is not worth its overhead.
+        tfm = np.array(Path(tfm_file).read_text().split(), dtype=float).reshape(4, 4)
 
         # Apply transformation to the mesh
         ply.transform(tfm)
 
-        # Prepar normals for visualization
-        ply.compute_vertex_normals()
+        # Prepare normals for visualization, unless the obj file
+        # already provided them
+        if not normals.any():
+            ply.compute_vertex_normals()
 
         return ply
+
+    @staticmethod
+    def _read_obj(obj_file):
+        """Returns the vertices, normals and faces of an AlignRT .obj file
+        as numpy arrays. The face indices are converted to start at 0."""
+
+        with open(obj_file, "rb") as obj, mmap.mmap(
+            obj.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buf:
+            if numba is not None and len(buf) > _NUMBA_MIN_OBJ_BYTES:
+                vertices, normals, faces, ps, fs = Surface._read_obj_with_numba(buf)
+            else:
+                vertices, normals, faces, ps, fs = Surface._read_obj_with_pandas(buf)
+
+        # Verify the arrays match the sizes in the header
+        if ps is not None:
+            assert ps == len(vertices), f"{len(vertices)} vertices, but ps is {ps}"
+            assert ps == len(normals), f"{len(normals)} normals, but ps is {ps}"
+        if fs is not None:
+            assert fs == len(faces), f"{len(faces)} faces, but fs is {fs}"
+
+        return vertices, normals, faces
+
+    @staticmethod
+    def _read_obj_with_numba(buf):
+        # Count the elements, then parse them straight into the arrays
+        data = np.frombuffer(buf, dtype=np.uint8)
+        num_v, num_vn, num_f, ps, fs = _count_obj_elements(data)
+
+        vertices = np.empty((num_v, 3), dtype=np.float32)
+        normals = np.empty((num_vn, 3), dtype=np.float32)
+        faces = np.empty((num_f, 3), dtype=np.int32)
+        _fill_obj_arrays(data, vertices, normals, faces)
+
+        ps = ps if ps >= 0 else None
+        fs = fs if fs >= 0 else None
+
+        return vertices, normals, faces, ps, fs
+
+    @staticmethod
+    def _read_obj_with_pandas(buf):
+        # Sort the lines into vertex, normal and face buffers in one pass
+        # over the memory map, without decoding it to str
+        buffers = {b"v": [], b"vn": [], b"f": []}
+        ps = None
+        fs = None
+
+        for line in iter(buf.readline, b""):
+            token, _, values = line.partition(b" ")
+
+            if token in buffers:
+                buffers[token].append(values)
+            elif token == b"ps":
+                ps = int(values)
+            elif token == b"fs":
+                fs = int(values)
+
+        vertices = Surface._parse_obj_values(b"".join(buffers[b"v"]), np.float32)
+        normals = Surface._parse_obj_values(b"".join(buffers[b"vn"]), np.float32)
+
+        # AlignRT faces are written as v1//n1 v2//n2 v3//n3, and the
+        # normal indices are the same as the vertex indices. Split the
+        # pairs into separate values and only keep the vertex indices.
+        # Faces in any other layout, such as v1 v2 v3 or v1/t1/n1, have
+        # everything after each vertex index removed instead.
+        face_lines = buffers[b"f"]
+        face_values = b"".join(face_lines)
+        if (
+            face_lines
+            and _OBJ_ALIGNRT_FACE_RE.fullmatch(face_lines[0])
+            and face_values.count(b"//") == 3 * len(face_lines)
+        ):
+            face_values = face_values.replace(b"//", b" ")
+            faces = Surface._parse_obj_values(face_values, np.int32, usecols=(0, 2, 4))
+        else:
+            face_values = _OBJ_FACE_SUFFIX_RE.sub(b"", face_values)
+            faces = Surface._parse_obj_values(face_values, np.int32)
+
+        # obj face indices start at 1, ply at 0
+        faces -= 1
+
+        return vertices, normals, faces, ps, fs
+
+    @staticmethod
+    def _parse_obj_values(text, dtype, usecols=None):
+        # Parse whitespace-separated rows of three values with the C parser
+        if not text:
+            return np.zeros((0, 3), dtype=dtype)
+
+        return pd.read_csv(
+            io.BytesIO(text),
+            sep=r"\s+",
+            header=None,
+            usecols=usecols,
+            dtype=dtype,
+            engine="c",
+        ).to_numpy()
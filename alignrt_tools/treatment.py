@@ -1,9 +1,82 @@
 """Classes for organizing AlignRT data into a calendar of fractions"""
 
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from math import ceil
+from pathlib import Path
 import numpy as np
+import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
-from datetime import datetime
+from datetime import date
+
+# numbagg is optional. When it is installed, the rolling averages in
+# session plots are computed with its compiled moving-window functions.
+try:
+    import numbagg
+except ImportError:
+    numbagg = None
+
+
+# tsdownsample is optional. When it is installed, long raw traces in
+# session plots are reduced with MinMaxLTTB before they are drawn.
+try:
+    from tsdownsample import NaNMinMaxLTTBDownsampler
+except ImportError:
+    NaNMinMaxLTTBDownsampler = None
+
+# Raw traces longer than this are downsampled before they are plotted
+_MAX_PLOT_POINTS = 3000
+
+
+def _downsample_trace(x, y, n_out=_MAX_PLOT_POINTS):
+    """Returns x and y reduced to n_out points with MinMaxLTTB, keeping
+    the peaks and NaN gaps. The trace is returned unchanged if it is
+    already short or tsdownsample is not installed."""
+
+    if NaNMinMaxLTTBDownsampler is None or len(x) <= n_out:
+        return x, y
+
+    idx = NaNMinMaxLTTBDownsampler().downsample(x, y, n_out=n_out)
+
+    return x[idx], y[idx]
+
+
+def _init_plot_worker():
+    # Worker processes only write files, so use the non-interactive backend
+    matplotlib.use("Agg")
+
+
+def _save_session_plot(session, path):
+    # Saves the translations and rotations plot of one session
+    fig, _ = session.get_translations_and_rotations_plot()
+    fig.savefig(path)
+    plt.close(fig)
+
+    return path
+
+
+def _centered_rolling_mean(df, window):
+    """Returns the centred rolling mean of each column of df, matching
+    df.rolling(window, center=True).mean()"""
+
+    # numbagg does not accept windows longer than the data
+    if numbagg is None or len(df) < window:
+        return df.rolling(window, center=True).mean()
+
+    # numbagg computes trailing windows over all of the columns at once.
+    # Its gufunc is compiled for a single thread, because the default
+    # parallel target starts numba's thread pool, and a process forked
+    # while that pool is running can deadlock. Shift the windows back
+    # so that each one is centred the way pandas centres it.
+    values = df.to_numpy(dtype=np.float64)
+    move_mean = numbagg.move_mean.gufunc(target="cpu")
+    trailing = move_mean(values, window, window, axis=0)
+    offset = (window - 1) // 2
+    centered = np.full_like(trailing, np.nan)
+    centered[: max(len(values) - offset, 0)] = trailing[offset:]
+
+    return pd.DataFrame(centered, index=df.index, columns=df.columns)
 
 
 class TreatmentCalendar:
@@ -40,16 +113,24 @@ class TreatmentCalendar:
 
         # Check to see if the df is None
         if df is not None:
-            # Create a new row in the DataFrame called "Date" from "DateTime"
-            df["Date"] = df["Clock Time"].apply(datetime.date)
+            # Sort the real-time deltas by time once, so that the days
+            # and sessions below are created in order and already sorted
+            df = df.sort_values("Clock Time", kind="mergesort")
+
+            # Create a new row in the DataFrame called "Date" from "DateTime".
+            # Truncating to whole days keeps it a datetime64 column rather
+            # than a column of date objects, so it is fast to group on.
+            df["Date"] = df["Clock Time"].values.astype("datetime64[D]")
 
-            for day in df["Date"].unique():
-                # Create a TreatmentDay using the subset of the DataFrame
-                # that includes the date
-                self.treatment_days.append(TreatmentDay(df[df["Date"] == day]))
+            # Create a TreatmentDay for each date. The groups of the
+            # sorted frame come out in date order.
+            for _, day_df in df.groupby("Date", sort=False):
+                self.treatment_days.append(TreatmentDay(day_df))
 
-            # Sort the days
-            self.treatment_days.sort(key=lambda td: td.treatment_date)
+        # Index the treatment days by date for get_treatment_day_by_date
+        self._treatment_days_by_date = {
+            td.treatment_date: td for td in self.treatment_days
+        }
 
     def get_treatment_day_by_date(self, tx_date):
         """Returns a TreatmentDay object with the same tx_date, if
@@ -66,14 +147,60 @@ class TreatmentCalendar:
         the date is not found
 
         """
-        if not isinstance(tx_date, datetime.date):
+        if not isinstance(tx_date, date):
             raise TypeError("tx_date must be of type datetime.date")
 
-        for td in self.treatment_days:
-            if td.treatment_date == tx_date:
-                return td
+        return self._treatment_days_by_date.get(tx_date)
+
+    def save_all_plots(self, outdir, workers=None):
+        """Saves the translations and rotations plot of every treatment
+        session
+
+        Each plot is saved as a PNG named after the session's start
+        time. By default the plots are drawn one at a time in the
+        calling process.
+
+        The sessions are independent, so passing workers greater than
+        one draws them in parallel in a pool of worker processes. The
+        workers are always spawned rather than forked, because forking
+        a process in which compiled code has already started threads,
+        such as after a plot has been drawn, can leave the workers
+        deadlocked. Spawned workers re-import the calling script, so a
+        script that uses them must guard its code with
+        if __name__ == "__main__".
+
+        Parameters
+        ----------
+        outdir : str or Path
+            The directory in which to save the plots. It is created if
+            it does not exist.
+        workers : int
+            The number of worker processes (default is None, which
+            draws the plots in the calling process)
+
+        Returns
+        -------
+        A list of the paths of the saved plots, in calendar order
+
+        """
+        outdir = Path(outdir)
+        outdir.mkdir(parents=True, exist_ok=True)
 
-        return None
+        sessions = [ts for td in self.treatment_days for ts in td.treatment_sessions]
+        paths = [
+            outdir / "{}.png".format(ts.treatment_time.strftime("%y%m%d %H%M%S"))
+            for ts in sessions
+        ]
+
+        if workers is None or workers <= 1:
+            return [_save_session_plot(ts, path) for ts, path in zip(sessions, paths)]
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_plot_worker,
+        ) as executor:
+            return list(executor.map(_save_session_plot, sessions, paths))
 
 
 class TreatmentDay:
@@ -126,9 +253,6 @@ class TreatmentDay:
             self.treatment_sessions.append(TreatmentSession(df))
             self.treatment_date = df["Clock Time"].min().date()
 
-            # Sort the treatment sessions by time
-            self.treatment_sessions.sort(key=lambda ts: ts.treatment_time)
-
 
 class TreatmentSession:
     """AlignRT treatment data from one treatment session
@@ -162,15 +286,16 @@ class TreatmentSession:
 
             self.treatment_time = df["Clock Time"].min()
 
-            # First, set the "Clock Time" to the index and sort by index
+            # First, set the "Clock Time" to the index and sort by index.
+            # Sessions from a TreatmentCalendar are already sorted.
             df = df.set_index("Clock Time")
-            df = df.sort_index()
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
 
-            # Next, let's add a new column called "True Elapsed Time (min)"
-            df["True Elapsed Time (min)"] = (
-                (df.index - df.index.min()).microseconds / 1000000
-                + (df.index - df.index.min()).seconds
-            ) / 60
+            # Next, let's add a new column called "True Elapsed Time (min)".
+            # The index is sorted, so the first time is the earliest.
+            elapsed = df.index.values - df.index.values[0]
+            df["True Elapsed Time (min)"] = elapsed / np.timedelta64(1, "m")
 
             self._df = df
 
@@ -206,12 +331,23 @@ class TreatmentSession:
         # Create a figure with two rows and one column
         fig, axs = plt.subplots(2, 1, figsize=[12, 6])
 
-        # Grab a subset of the dataframe that exludes the 999 values
-        # that are used when the patient is not found
-        dfplot = self._df[self._df[" D.MAG (cm)"] < 999.0]
-
-        # Create a subset of dfplot that includes only beam-on time
-        dfbo = dfplot[dfplot[" XRayState"] == 1]
+        # Columns that are plotted with a rolling average
+        roll_cols = [
+            " D.VRT (cm)",
+            " D.LNG (cm)",
+            " D.LAT (cm)",
+            " D.MAG (cm)",
+            " D.Rtn (deg)",
+            " D.Roll (deg)",
+            " D.Pitch (deg)",
+        ]
+        plot_cols = roll_cols + ["True Elapsed Time (min)", " XRayState"]
+
+        # Grab the plotted columns of the dataframe, excluding the 999
+        # values that are used when the patient is not found. The
+        # metadata columns are left behind rather than copied.
+        valid = self._df[" D.MAG (cm)"].to_numpy() < 999.0
+        dfplot = self._df[plot_cols][valid]
 
         # Set plot parameters
         lw = 0.5  # line width for raw data
@@ -220,18 +356,37 @@ class TreatmentSession:
         alp_rw = 1  # alpha for rolling average data
         rw = 20  # rolling window width
 
+        # Compute the rolling averages for all of the plotted columns at once
+        roll = _centered_rolling_mean(dfplot[roll_cols], rw)
+
+        # Extract the time axis and beam state once for all of the plots
+        t = dfplot["True Elapsed Time (min)"].to_numpy()
+        xrs = dfplot[" XRayState"].to_numpy()
+
+        # Mask of the beam-on samples, used for the axis limits
+        beam_on = xrs == 1
+
+        # Both plots end at the last beam-on time
+        t_bo = t[beam_on]
+        t_bo_max = t_bo.max() if t_bo.size else 0.0
+
+        # Add beam-on time to both plots. The fill runs from -10 to 10
+        # while the beam is on.
+        beam_on_fill = 20.0 * xrs - 10.0
+        for ax in axs:
+            ax.fill_between(t, -10.0, beam_on_fill, color="r", alpha=0.4)
+
         # Plot the raw VRT and the VRT rolling average
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.VRT (cm)"],
+            *_downsample_trace(t, dfplot[" D.VRT (cm)"].to_numpy()),
             color="#5654F7",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.VRT (cm)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.VRT (cm)"],
             color="#5654F7",
             linewidth=lw_rw,
             alpha=alp_rw,
@@ -240,16 +395,15 @@ class TreatmentSession:
 
         # Plot the raw LNG and the LNG rolling average
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.LNG (cm)"],
+            *_downsample_trace(t, dfplot[" D.LNG (cm)"].to_numpy()),
             color="#CF161E",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.LNG (cm)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.LNG (cm)"],
             color="#CF161E",
             linewidth=lw_rw,
             alpha=alp_rw,
@@ -258,16 +412,15 @@ class TreatmentSession:
 
         # Plot the raw LAT and the LAT rolling average
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.LAT (cm)"],
+            *_downsample_trace(t, dfplot[" D.LAT (cm)"].to_numpy()),
             color="#41bf71",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.LAT (cm)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.LAT (cm)"],
             color="#41bf71",
             linewidth=lw_rw,
             alpha=alp_rw,
@@ -276,40 +429,31 @@ class TreatmentSession:
 
         # Plot the raw MAG and the MAG rolling average
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.MAG (cm)"],
+            *_downsample_trace(t, dfplot[" D.MAG (cm)"].to_numpy()),
             color="#000000",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[0].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.MAG (cm)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.MAG (cm)"],
             color="#000000",
             linewidth=lw_rw,
             alpha=alp_rw,
             label="Magnitude",
         )
 
-        # Add beam-on time
-        axs[0].fill_between(
-            dfplot["True Elapsed Time (min)"],
-            -10 * np.ones(len(dfplot)),
-            20 * dfplot[" XRayState"] - 10,
-            color="r",
-            alpha=0.4,
-        )
-
         # Add labels for the first plot
         axs[0].set_xlabel("Time (min)")
         axs[0].set_ylabel("Real-time Position (cm)")
 
         # Set x axis limits
-        axs[0].set_xlim(0, ceil(dfbo["True Elapsed Time (min)"].max()) + 0.2)
+        axs[0].set_xlim(0, ceil(t_bo_max) + 0.2)
 
         # Determine maximum magnitude during beam-on time
-        max_beam_on_mag = dfbo[" D.MAG (cm)"].max()
+        mag_bo = dfplot[" D.MAG (cm)"].to_numpy()[beam_on]
+        max_beam_on_mag = mag_bo.max() if mag_bo.size else 0.0
 
         # Set y axis limits
         axs[0].set_ylim(-1.5 * max_beam_on_mag, 1.5 * max_beam_on_mag)
@@ -317,16 +461,15 @@ class TreatmentSession:
 
         # Plot the raw Rtn and the Rtn rolling average
         axs[1].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.Rtn (deg)"],
+            *_downsample_trace(t, dfplot[" D.Rtn (deg)"].to_numpy()),
             color="#5654F7",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[1].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.Rtn (deg)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.Rtn (deg)"],
             color="#5654F7",
             linewidth=lw_rw,
             alpha=alp_rw,
@@ -335,16 +478,15 @@ class TreatmentSession:
 
         # Plot the raw Roll and the Roll rolling average
         axs[1].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.Roll (deg)"],
+            *_downsample_trace(t, dfplot[" D.Roll (deg)"].to_numpy()),
             color="#CF161E",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[1].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.Roll (deg)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.Roll (deg)"],
             color="#CF161E",
             linewidth=lw_rw,
             alpha=alp_rw,
@@ -353,44 +495,32 @@ class TreatmentSession:
 
         # Plot the raw Pitch and the Pitch rolling average
         axs[1].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.Pitch (deg)"],
+            *_downsample_trace(t, dfplot[" D.Pitch (deg)"].to_numpy()),
             color="#41bf71",
             linewidth=lw,
             alpha=alp,
             label="_nolegend_",
         )
         axs[1].plot(
-            dfplot["True Elapsed Time (min)"],
-            dfplot[" D.Pitch (deg)"].rolling(rw, center=True).mean(),
+            t,
+            roll[" D.Pitch (deg)"],
             color="#41bf71",
             linewidth=lw_rw,
             alpha=alp_rw,
             label="Pitch",
         )
 
-        # Add beam-on time
-        axs[1].fill_between(
-            dfplot["True Elapsed Time (min)"],
-            -10 * np.ones(len(dfplot)),
-            20 * dfplot[" XRayState"] - 10,
-            color="r",
-            alpha=0.4,
-        )
-
         # Add labels for the second plot
         axs[1].set_xlabel("Time (min)")
         axs[1].set_ylabel("Real-time Rotation (deg)")
 
         # Set x axis limits
-        axs[1].set_xlim(0, ceil(dfbo["True Elapsed Time (min)"].max()) + 0.2)
+        axs[1].set_xlim(0, ceil(t_bo_max) + 0.2)
 
         # Determine maximum absolute pitch, roll or rotation:
-        max_of_all = (
-            np.abs(dfbo[[" D.Rtn (deg)", " D.Pitch (deg)", " D.Roll (deg)"]])
-            .max()
-            .max()
-        )
+        rot = dfplot[[" D.Rtn (deg)", " D.Pitch (deg)", " D.Roll (deg)"]].to_numpy()
+        rot = rot[beam_on]
+        max_of_all = np.nanmax(np.abs(rot)) if rot.size else 0.0
 
         # Set y axis limits
         axs[1].set_ylim(-1.5 * max_of_all, 1.5 * max_of_all)
@@ -400,6 +530,117 @@ class TreatmentSession:
 
         return fig, axs
 
+    def get_translations_and_rotations_plotly(self, max_n_samples=_MAX_PLOT_POINTS):
+        """Get an interactive plot of translations and rotations
+
+        Returns a plotly figure with the same traces as
+        get_translations_and_rotations_plot(). The figure is wrapped in
+        a plotly-resampler FigureResampler, so only about max_n_samples
+        points of each trace are drawn and they are resampled again when
+        the plot is zoomed. This keeps long sessions responsive. The
+        plotly and plotly-resampler packages must be installed.
+
+        Parameters
+        ----------
+        max_n_samples : int
+            The number of points drawn for each trace
+
+        Returns
+        -------
+        fig : FigureResampler
+            A plotly figure that contains plots of the real-time delta
+            translations (top) and rotations (bottom) for this session
+
+        """
+
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+        from plotly_resampler import FigureResampler
+
+        fig = FigureResampler(
+            make_subplots(rows=2, cols=1, shared_xaxes=True),
+            default_n_shown_samples=max_n_samples,
+        )
+
+        # The column, color and legend label of the traces in each row
+        rows = [
+            [
+                (" D.VRT (cm)", "#5654F7", "Vertical"),
+                (" D.LNG (cm)", "#CF161E", "Longitudinal"),
+                (" D.LAT (cm)", "#41bf71", "Lateral"),
+                (" D.MAG (cm)", "#000000", "Magnitude"),
+            ],
+            [
+                (" D.Rtn (deg)", "#5654F7", "Rotation"),
+                (" D.Roll (deg)", "#CF161E", "Roll"),
+                (" D.Pitch (deg)", "#41bf71", "Pitch"),
+            ],
+        ]
+        roll_cols = [col for traces in rows for col, _, _ in traces]
+        plot_cols = roll_cols + ["True Elapsed Time (min)", " XRayState"]
+
+        # Grab the plotted columns of the dataframe, excluding the 999
+        # values that are used when the patient is not found
+        valid = self._df[" D.MAG (cm)"].to_numpy() < 999.0
+        dfplot = self._df[plot_cols][valid]
+
+        rw = 20  # rolling window width
+        roll = _centered_rolling_mean(dfplot[roll_cols], rw)
+
+        t = dfplot["True Elapsed Time (min)"].to_numpy()
+        beam_on = dfplot[" XRayState"].to_numpy() == 1
+
+        # Plot the raw data and the rolling average of each column
+        for row, traces in enumerate(rows, start=1):
+            for col, color, label in traces:
+                fig.add_trace(
+                    go.Scattergl(
+                        name=label,
+                        line=dict(color=color, width=0.5),
+                        opacity=0.3,
+                        showlegend=False,
+                    ),
+                    hf_x=t,
+                    hf_y=dfplot[col].to_numpy(),
+                    row=row,
+                    col=1,
+                )
+                fig.add_trace(
+                    go.Scattergl(name=label, line=dict(color=color, width=2)),
+                    hf_x=t,
+                    hf_y=roll[col].to_numpy(),
+                    row=row,
+                    col=1,
+                )
+
+        # Shade each beam-on interval in both rows
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], beam_on, [0]))))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            fig.add_vrect(
+                x0=t[start],
+                x1=t[stop - 1],
+                fillcolor="red",
+                opacity=0.4,
+                line_width=0,
+                row="all",
+                col=1,
+            )
+
+        # Set the axis limits from the beam-on data, as in the static plot
+        t_bo = t[beam_on]
+        t_bo_max = t_bo.max() if t_bo.size else 0.0
+        fig.update_xaxes(range=[0, ceil(t_bo_max) + 0.2], title_text="Time (min)")
+
+        for row, traces in enumerate(rows, start=1):
+            values = dfplot[[col for col, _, _ in traces]].to_numpy()[beam_on]
+            max_of_all = np.nanmax(np.abs(values)) if values.size else 0.0
+            fig.update_yaxes(range=[-1.5 * max_of_all, 1.5 * max_of_all], row=row)
+
+        fig.update_yaxes(title_text="Real-time Position (cm)", row=1)
+        fig.update_yaxes(title_text="Real-time Rotation (deg)", row=2)
+
+        return fig
+
     def get_translations_plot(self):
         pass
 
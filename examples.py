@@ -1,5 +1,7 @@
 """ Examples demonstrating how to use alignrt_tools"""
 import time
+from open3d.core import Device, Tensor, cuda
+from open3d.core.nns import NearestNeighborSearch
 from open3d.geometry import PointCloud, TriangleMesh
 from open3d.utility import Vector3dVector
 from open3d.visualization import draw_geometries
@@ -25,29 +27,52 @@ df = pc.get_collection_as_dataframe()
 
 def get_first_plan(pc, plan_str):
 
-    for px in pc.patients:
-        for sx in px.sites:
-            for fx in sx.phases:
-                if plan_str in fx.details["Description"]:
-                    return px
+    # Search the collection's flat index rather than walking the tree
+    index_df = pc.get_index_dataframe()
+    phase_desc = index_df["phase_desc"]
+    matches = index_df[phase_desc.str.contains(plan_str, regex=False, na=False)]
+
+    if len(matches) > 0:
+        return pc.patients[matches["patient_idx"].iloc[0]]
 
 
 def get_first_surface(px):
 
-    for sx in px.sites:
-        for phx in sx.phases:
-            for fx in phx.fields:
-                for ux in fx.surfaces:
-                    return ux.get_surface_mesh()
+    ux = next(
+        (
+            ux
+            for sx in px.sites
+            for phx in sx.phases
+            for fx in phx.fields
+            for ux in fx.surfaces
+        ),
+        None,
+    )
+
+    if ux is not None:
+        return ux.get_surface_mesh()
+
+
+def compute_point_cloud_distance(source, target):
+    """Returns the distance from each source point to its nearest target
+    point. The search runs on the GPU when Open3D was built with CUDA."""
+
+    device = Device("CUDA:0" if cuda.is_available() else "CPU:0")
+
+    nns = NearestNeighborSearch(Tensor(target, device=device))
+    nns.knn_index()
+    _, sq_dist = nns.knn_search(Tensor(source, device=device), 1)
+
+    return np.sqrt(sq_dist.cpu().numpy().ravel())
+
+
+# Distances below 10 are blue, below 15 green, and the rest red
+MAG_THRESHOLDS = np.array([10.0, 15.0])
+MAG_COLORS = np.array([[0, 0, 1], [0, 1, 0], [1, 0, 0]], dtype=np.float64)
 
 
 def mag_to_color(x):
-    if x < 10:
-        return (0, 0, 1)
-    if x < 15:
-        return (0, 1, 0)
-    else:
-        return (1, 0, 0)
+    return MAG_COLORS[np.searchsorted(MAG_THRESHOLDS, x, side="right")]
 
 
 first_px = get_first_plan(pc, "BreR")
@@ -64,12 +89,12 @@ xyz = np.asarray(pcd.points) + 10
 pcd2.points = Vector3dVector(xyz)
 # open3d.draw_geometries([pcd, pcd2])
 start = time.time()
-diff = pcd2.compute_point_cloud_distance(pcd)
+diff = compute_point_cloud_distance(xyz, np.asarray(pcd.points))
 end = time.time()
 
 print(f"The difference calculation was computed in {end - start} seconds.")
-print(f"The min and max differences are {min(diff)} and {max(diff)}")
+print(f"The min and max differences are {diff.min()} and {diff.max()}")
 
-ply.vertex_colors = Vector3dVector(np.array(list(map(mag_to_color, diff))))
+ply.vertex_colors = Vector3dVector(mag_to_color(diff))
 
 draw_geometries([ply, pcd2, origin], width=1080, height=640)
@@ -0,0 +1,144 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignrt_tools.generic import (
+    GenericAlignRTClass,
+    _append_details,
+    _concat_frames,
+    _parse_dt,
+)
+
+PATIENT = """<Patient>
+  <PatientTextureLuminosity>3</PatientTextureLuminosity>
+  <GUID>abc-123</GUID>
+  <PatientID>12345</PatientID>
+  <PatientID>duplicate</PatientID>
+  <Unknown>ignored</Unknown>
+  <IsFromDicom>false</IsFromDicom>
+  <IsApproved>true</IsApproved>
+  <IsDynamicBeamType>maybe</IsDynamicBeamType>
+  <IsoXValue>-1.5</IsoXValue>
+  <Notes/>
+  <DOB>1950-02-03T00:00:00</DOB>
+  <LatestApprovedRecordSurfaceTimestamp>2020-01-02T10:15:00.1234567Z</LatestApprovedRecordSurfaceTimestamp>
+  <Sites><Site><Description>Breast</Description></Site></Sites>
+</Patient>
+"""
+
+
+def _details_by_find(tree):
+    # The details as read by calling tree.find() for each known tag
+    return {
+        tag: tree.find(tag).text
+        for tag in GenericAlignRTClass.alignrt_data_tags
+        if tree.find(tag) is not None
+    }
+
+
+def test_details_match_find(monkeypatch):
+    tree = ET.fromstring(PATIENT)
+
+    # Compare the walk before the type conversions are applied
+    monkeypatch.setattr(GenericAlignRTClass, "_type_converters", {})
+    details = GenericAlignRTClass(tree=tree).details
+
+    assert details == _details_by_find(tree)
+    assert list(details) == list(_details_by_find(tree))
+    assert details["PatientID"] == "12345"
+    assert "Unknown" not in details
+    assert "Description" not in details
+
+
+def test_type_conversions():
+    details = GenericAlignRTClass(tree=ET.fromstring(PATIENT)).details
+
+    assert details["PatientTextureLuminosity"] == 3
+    assert details["IsFromDicom"] is False
+    assert details["IsApproved"] is True
+    assert details["IsDynamicBeamType"] == "maybe"
+    assert details["IsoXValue"] == -1.5
+    assert details["Notes"] is None
+    assert details["DOB"] == datetime(1950, 2, 3)
+    assert details["LatestApprovedRecordSurfaceTimestamp"] == datetime(
+        2020, 1, 2, 10, 15, 0, 123456, tzinfo=timezone.utc
+    )
+
+
+@pytest.mark.parametrize(
+    "dt_str, expected",
+    [
+        ("1950-02-03T00:00:00", datetime(1950, 2, 3)),
+        ("2020-01-02T10:15:00.123", datetime(2020, 1, 2, 10, 15, 0, 123000)),
+        (
+            "2020-01-02T10:15:00.1234567+02:00",
+            datetime(
+                2020, 1, 2, 10, 15, 0, 123456, tzinfo=timezone(timedelta(hours=2))
+            ),
+        ),
+    ],
+)
+def test_parse_dt(dt_str, expected):
+    assert _parse_dt(dt_str) == expected
+
+
+def _details_frame(rows, site, **details):
+    df = pd.DataFrame({"x": np.arange(rows, dtype=np.float32)})
+    return _append_details(df, {"Site": site, **details})
+
+
+def test_append_details():
+    df = pd.DataFrame({"x": np.arange(3, dtype=np.float32)})
+    result = _append_details(
+        df, {"Site": "Breast", "Threshold": 0.3, "Created": datetime(2020, 1, 2)}
+    )
+
+    assert list(result.columns) == ["x", "Site", "Threshold", "Created"]
+    assert result["Site"].dtype == "category"
+    assert result["Site"].cat.categories.tolist() == ["Breast"]
+    assert result["Site"].tolist() == ["Breast"] * 3
+    assert result["Threshold"].tolist() == [0.3] * 3
+    assert result["Created"].tolist() == [pd.Timestamp(2020, 1, 2)] * 3
+
+    # The result does not share data with df
+    result.loc[0, "x"] = 99
+    assert df.loc[0, "x"] == 0
+
+
+def test_concat_frames_keeps_categoricals():
+    frames = [
+        _details_frame(2, "Breast", Phase="BreR"),
+        _details_frame(3, "Lung"),
+        _details_frame(1, "Breast", Phase="BreL"),
+    ]
+
+    df = _concat_frames(frames)
+
+    assert df["x"].tolist() == [0, 1, 0, 1, 2, 0]
+    assert df.index.tolist() == list(range(6))
+
+    # Categoricals with different categories are combined
+    assert df["Site"].dtype == "category"
+    assert df["Site"].tolist() == ["Breast"] * 2 + ["Lung"] * 3 + ["Breast"]
+
+    # A column missing from one frame is missing in its rows
+    assert df["Phase"].dtype == "category"
+    assert df["Phase"].tolist()[:2] == ["BreR", "BreR"]
+    assert df["Phase"].isna().tolist() == [False] * 2 + [True] * 3 + [False]
+    assert df["Phase"].tolist()[-1] == "BreL"
+
+
+def test_concat_frames_mixed_column():
+    # A column that is not categorical in every frame is left to pd.concat
+    frames = [
+        _details_frame(2, "Breast"),
+        pd.DataFrame({"x": [0.0], "Site": ["Lung"]}),
+    ]
+
+    df = _concat_frames(frames)
+
+    assert df["Site"].dtype != "category"
+    assert df["Site"].tolist() == ["Breast", "Breast", "Lung"]
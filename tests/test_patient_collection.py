@@ -0,0 +1,101 @@
+import xml.etree.ElementTree as ET
+
+from alignrt_tools.patient import Patient, PatientCollection
+from alignrt_tools.surface import Surface
+
+VPAX = """<Patient>
+  <PatientID>{pid}</PatientID>
+  <Sites>
+    <Site>
+      <Description>Breast</Description>
+      <Phases>
+        <Phase>
+          <Description>BreR</Description>
+          <Fields>
+            <Field><Description>Iso</Description></Field>
+            <Field><Description>Tang</Description></Field>
+          </Fields>
+        </Phase>
+        <Phase>
+          <Description>Boost</Description>
+          <Fields/>
+        </Phase>
+      </Phases>
+    </Site>
+  </Sites>
+</Patient>
+"""
+
+COLUMNS = [
+    "patient_idx",
+    "site_idx",
+    "phase_idx",
+    "field_idx",
+    "surface_idx",
+    "phase_desc",
+    "field_desc",
+    "surface_label",
+]
+
+
+def _patient(pid):
+    return Patient(tree=ET.fromstring(VPAX.format(pid=pid)))
+
+
+def _surface(tmp_path):
+    surface_path = tmp_path / "200102 093005"
+    surface_path.mkdir()
+    (surface_path / "capture.ini").write_text("[Capture]\nLabel Prefix=Ref\n")
+    (surface_path / "site.ini").write_text('[Site]\nPhase="BreR"\nField="Iso"\n')
+    return Surface(surface_path)
+
+
+def test_index_dataframe(tmp_path):
+    pc = PatientCollection()
+    pc.patients = [_patient("1"), _patient("2")]
+    pc.patients[1].sites[0].phases[0].fields[0].surfaces.append(_surface(tmp_path))
+
+    index_df = pc.get_index_dataframe()
+
+    assert list(index_df.columns) == COLUMNS
+
+    # Missing descriptions are None or NaN, depending on the pandas version
+    rows = index_df.astype(object).where(index_df.notna(), None).values.tolist()
+    assert rows == [
+        [0, 0, 0, 0, -1, "BreR", "Iso", None],
+        [0, 0, 0, 1, -1, "BreR", "Tang", None],
+        [0, 0, 1, -1, -1, "Boost", None, None],
+        [1, 0, 0, 0, 0, "BreR", "Iso", "Iso Ref 2020-01-02 09:30:05"],
+        [1, 0, 0, 1, -1, "BreR", "Tang", None],
+        [1, 0, 1, -1, -1, "Boost", None, None],
+    ]
+
+    # The index is cached while the patients are unchanged
+    assert pc.get_index_dataframe() is index_df
+
+
+def test_index_dataframe_rebuilt_when_patients_change():
+    pc = PatientCollection()
+    pc.patients = [_patient("1")]
+    first = pc.get_index_dataframe()
+
+    # A patient is appended
+    pc.patients.append(_patient("2"))
+    appended = pc.get_index_dataframe()
+    assert appended is not first
+    assert appended["patient_idx"].max() == 1
+
+    # A patient is replaced by a reloaded one
+    pc.patients[1] = _patient("2")
+    replaced = pc.get_index_dataframe()
+    assert replaced is not appended
+
+    # A patient is removed
+    del pc.patients[0]
+    removed = pc.get_index_dataframe()
+    assert removed is not replaced
+    assert removed["patient_idx"].max() == 0
+
+    # The list is replaced by an empty one
+    pc.patients = []
+    assert pc.get_index_dataframe().empty
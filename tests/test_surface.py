@@ -0,0 +1,332 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignrt_tools import surface
+from alignrt_tools.surface import Surface
+
+OBJ_LINES = [
+    "# AlignRT obj",
+    "ps 4",
+    "fs 2",
+    "mtllib capture.mtl",
+    "vt 0.5 0.5",
+    "v 1.5 -2 3e-1",
+    "v +0.125 0.0 -1.25E+2",
+    "v 10 20 30",
+    "v -0.000001 1234567.5 .5",
+    "vn 0 0 1",
+    "vn 0 1 0",
+    "vn 1 0 0",
+    "vn -0.6 0.8 0",
+]
+
+FACES = [(1, 2, 3), (2, 3, 4)]
+
+
+def _write_obj(path, face_format, newline):
+    faces = ["f " + " ".join(face_format.format(i) for i in face) for face in FACES]
+    path.write_bytes(newline.join(OBJ_LINES + faces).encode() + newline.encode())
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("face_format", ["{0}//{0}", "{0}", "{0}/{0}", "{0}/{0}/{0}"])
+def test_read_obj(tmp_path, monkeypatch, face_format, newline):
+    obj_path = tmp_path / "capture.obj"
+    _write_obj(obj_path, face_format, newline)
+
+    # Files below the size limit are read with the pandas parser
+    monkeypatch.setattr(surface, "_NUMBA_MIN_OBJ_BYTES", 10**12)
+    vertices, normals, faces = Surface._read_obj(obj_path)
+
+    expected = [[1.5, -2, 0.3], [0.125, 0, -125], [10, 20, 30], [-1e-6, 1234567.5, 0.5]]
+    np.testing.assert_array_equal(vertices, np.array(expected, dtype=np.float32))
+    assert normals.shape == (4, 3)
+    np.testing.assert_array_equal(faces, [[0, 1, 2], [1, 2, 3]])
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("face_format", ["{0}//{0}", "{0}", "{0}/{0}", "{0}/{0}/{0}"])
+def test_read_obj_with_numba_matches_pandas(
+    tmp_path, monkeypatch, face_format, newline
+):
+    pytest.importorskip("numba")
+
+    obj_path = tmp_path / "capture.obj"
+    _write_obj(obj_path, face_format, newline)
+
+    monkeypatch.setattr(surface, "_NUMBA_MIN_OBJ_BYTES", 10**12)
+    expected = Surface._read_obj(obj_path)
+
+    monkeypatch.setattr(surface, "_NUMBA_MIN_OBJ_BYTES", 0)
+    result = Surface._read_obj(obj_path)
+
+    for array, expected_array in zip(result, expected):
+        assert array.dtype == expected_array.dtype
+        np.testing.assert_array_equal(array, expected_array)
+
+
+def test_read_obj_checks_header_sizes(tmp_path, monkeypatch):
+    obj_path = tmp_path / "capture.obj"
+    _write_obj(obj_path, "{0}//{0}", "\n")
+    obj_path.write_bytes(obj_path.read_bytes().replace(b"fs 2", b"fs 3"))
+
+    monkeypatch.setattr(surface, "_NUMBA_MIN_OBJ_BYTES", 10**12)
+    with pytest.raises(AssertionError):
+        Surface._read_obj(obj_path)
+
+
+def _read_ini_by_line(ini_path):
+    # The line-by-line reader that _read_ini replaces
+    details = {}
+    with open(ini_path, "r", encoding="latin-1") as ini:
+        for line in ini:
+            key, sep, value = line.rstrip("\n").partition("=")
+            if sep and value:
+                details[key] = value
+    return details
+
+
+def test_read_ini(tmp_path):
+    ini_path = tmp_path / "site.ini"
+    ini_path.write_bytes(
+        "[Site]\n"
+        "Treatment Site=Breast\n"
+        'Phase="BreR"\n'
+        "Empty=\n"
+        "Comment=a=b\n"
+        "Label Prefix=Réf\n"
+        "No value on this line\n".encode("latin-1")
+    )
+
+    details = surface._read_ini(ini_path)
+
+    assert details == {
+        "Treatment Site": "Breast",
+        "Phase": '"BreR"',
+        "Comment": "a=b",
+        "Label Prefix": "Réf",
+    }
+    assert details == _read_ini_by_line(ini_path)
+
+
+def test_read_ini_with_crlf(tmp_path):
+    ini_path = tmp_path / "capture.ini"
+    ini_path.write_bytes(b"[Capture]\r\nLabel Prefix=Ref\r\nEmpty=\r\nIs From Dicom=0")
+
+    details = surface._read_ini(ini_path)
+
+    assert details == {"Label Prefix": "Ref", "Is From Dicom": "0"}
+    assert details == _read_ini_by_line(ini_path)
+
+
+RTD_HEADER = (
+    b"Patient ID:, 12345\r\n"
+    b"Start Time:, 200102_093005.123\x00\x00\n"
+    b"End Time:, 200102_093105.000\n"
+    b"Threshold:, 0.3\n"
+    b"Blank\n"
+)
+
+
+def test_rtd_header_matches_line_split():
+    details = dict(surface._RTD_HEADER_RE.findall(RTD_HEADER.decode("latin-1")))
+
+    # The header as read by splitting each line on ":, "
+    expected = {}
+    for line in RTD_HEADER.decode("latin-1").splitlines():
+        pieces = line.split(":, ")
+        if len(pieces) > 1:
+            expected[pieces[0]] = pieces[1].split("\x00")[0]
+
+    assert details == expected
+
+
+@pytest.mark.parametrize(
+    "time_str, time_format",
+    [
+        ("200102 093005", "%y%m%d %H%M%S"),
+        ("991231 235959", "%y%m%d %H%M%S"),
+        ("200102_093005.123", "%y%m%d_%H%M%S"),
+        ("200102_093005", "%y%m%d_%H%M%S"),
+        ("680102 093005", "%y%m%d %H%M%S"),
+        ("690102 093005", "%y%m%d %H%M%S"),
+    ],
+)
+def test_parse_alignrt_time(time_str, time_format):
+    expected = datetime.strptime(time_str.split(".")[0], time_format)
+
+    assert surface._parse_alignrt_time(time_str) == expected
+
+
+@pytest.mark.parametrize(
+    "time_str",
+    [
+        "",
+        "200102",
+        "200102 0930",
+        "200102-093005",
+        "2001020093005",
+        "200102 09300x",
+        "2001 2 093005",
+        "200102 093005 extra",
+        "New Folder",
+        "201302 093005",
+    ],
+)
+def test_parse_alignrt_time_rejects_malformed(time_str):
+    with pytest.raises(ValueError):
+        surface._parse_alignrt_time(time_str)
+
+
+def _write_rtd(path, unit, rows=50):
+    rng = np.random.default_rng(0)
+    with open(path, "wb") as rtd:
+        # Pad the header to its full length with extra details
+        rtd.write(RTD_HEADER)
+        for i in range(surface._RTD_HEADER_LINES - RTD_HEADER.count(b"\n")):
+            rtd.write("Key{}:, value{}\n".format(i, i).encode())
+        rtd.write(
+            (
+                "Elapsed Time (sec), D.VRT ({0}), D.LNG ({0}), D.LAT ({0}), "
+                "D.Rtn (deg), D.Roll (deg), D.Pitch (deg), XRayState\n"
+            )
+            .format(unit)
+            .encode()
+        )
+        for i in range(rows):
+            values = rng.normal(scale=0.2, size=6)
+            rtd.write(
+                "{:.3f}, {:.4f}, {:.4f}, {:.4f}, {:.4f}, {:.4f}, {:.4f}, {}\n".format(
+                    0.2 * (i + 1), *values, int(10 < i < 30)
+                ).encode()
+            )
+
+
+@pytest.mark.parametrize("truncated", [False, True])
+@pytest.mark.parametrize("unit", ["cm", "mm"])
+def test_parse_one_rtd_readers_match(tmp_path, monkeypatch, unit, truncated):
+    pytest.importorskip("pyarrow")
+
+    rtd_path = tmp_path / "RealTimeDeltas_200102_093005.txt"
+    _write_rtd(rtd_path, unit)
+    if truncated:
+        # A last row cut short by an interrupted export
+        with open(rtd_path, "ab") as rtd:
+            rtd.write(b"10.200, 0.1000, 0.2000")
+
+    with_pyarrow = Surface._parse_one_rtd(rtd_path)
+    monkeypatch.setattr(surface, "pa_csv", None)
+    with_pandas = Surface._parse_one_rtd(rtd_path)
+
+    pd.testing.assert_frame_equal(with_pyarrow, with_pandas)
+    assert with_pandas["Start Time"].iloc[0] == datetime(2020, 1, 2, 9, 30, 5)
+    assert with_pandas[" D.VRT (cm)"].dtype == np.float32
+
+
+def test_parse_one_rtd_header_details(tmp_path):
+    rtd_path = tmp_path / "RealTimeDeltas_200102_093005.txt"
+    _write_rtd(rtd_path, "cm")
+
+    df = Surface._parse_one_rtd(rtd_path)
+
+    # Line endings and the NUL padding after Start Time are not kept
+    assert df["Patient ID"].iloc[0] == "12345"
+    assert df["Threshold"].iloc[0] == "0.3"
+    assert df["Start Time"].iloc[0] == datetime(2020, 1, 2, 9, 30, 5)
+    assert df["End Time"].iloc[0] == datetime(2020, 1, 2, 9, 31, 5)
+    assert "Blank" not in df
+
+    # The Clock Time counts from the Start Time
+    assert df["Clock Time"].iloc[0] == pd.Timestamp(2020, 1, 2, 9, 30, 5, 200000)
+
+
+def test_magnitude_kernel_matches_numpy(monkeypatch):
+    pytest.importorskip("numba")
+
+    rng = np.random.default_rng(0)
+    columns = [" D.VRT (cm)", " D.LAT (cm)", " D.LNG (cm)"]
+    df = pd.DataFrame(rng.normal(size=(1000, 3)).astype(np.float32), columns=columns)
+
+    monkeypatch.setattr(surface, "_NUMBA_MIN_ROWS", 10**12)
+    expected = Surface._magnitude(df)
+    monkeypatch.setattr(surface, "_NUMBA_MIN_ROWS", 0)
+    result = Surface._magnitude(df)
+
+    assert result.dtype == expected.dtype
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+def test_parse_one_rtd_keeps_truncated_row(tmp_path, monkeypatch):
+    rtd_path = tmp_path / "RealTimeDeltas_200102_093005.txt"
+    _write_rtd(rtd_path, "cm")
+    with open(rtd_path, "ab") as rtd:
+        rtd.write(b"10.200, 0.1000, 0.2000")
+
+    monkeypatch.setattr(surface, "pa_csv", None)
+    df = Surface._parse_one_rtd(rtd_path)
+
+    assert len(df) == 51
+    assert df[" D.LNG (cm)"].iloc[-1] == np.float32(0.2)
+    assert np.isnan(df[" D.LAT (cm)"].iloc[-1])
+    assert np.isnan(df[" XRayState"].iloc[-1])
+    assert df[" XRayState"].iloc[:-1].isin([0, 1]).all()
+
+
+def _write_surface(tmp_path):
+    surface_path = tmp_path / "200102 093005"
+    surface_path.mkdir()
+    (surface_path / "capture.ini").write_text("[Capture]\nLabel Prefix=Ref\n")
+    (surface_path / "site.ini").write_text('[Site]\nPhase="BreR"\nField="Iso"\n')
+    return surface_path
+
+
+def test_open_reuses_surface(tmp_path, monkeypatch):
+    surface_path = _write_surface(tmp_path)
+    Surface._cached.cache_clear()
+
+    first = Surface.open(surface_path)
+    assert Surface.open(surface_path) is first
+
+    # A str and a relative path to the same directory share the entry
+    assert Surface.open(str(surface_path)) is first
+    monkeypatch.chdir(tmp_path)
+    assert Surface.open(surface_path.name) is first
+
+
+def test_open_sees_new_realtimedeltas(tmp_path):
+    surface_path = _write_surface(tmp_path)
+    Surface._cached.cache_clear()
+    first = Surface.open(surface_path)
+
+    # A new Monitoring folder without a RealTimeDeltas file yet
+    monitoring_path = surface_path / "Monitoring_200102_093005"
+    monitoring_path.mkdir()
+    second = Surface.open(surface_path)
+    assert second is not first
+
+    # The RealTimeDeltas file is written into the existing folder
+    rtd_path = monitoring_path / "RealTimeDeltas_200102_093005.txt"
+    _write_rtd(rtd_path, "cm")
+    third = Surface.open(surface_path)
+    assert third is not second
+    assert len(third.get_realtimedeltas_as_dataframe()) == 50
+
+    # The file is appended to
+    with open(rtd_path, "ab") as rtd:
+        rtd.write(b"10.200, 0.1, 0.2, 0.3, 0.1, 0.2, 0.3, 0\n")
+    fourth = Surface.open(surface_path)
+    assert fourth is not third
+    assert len(fourth.get_realtimedeltas_as_dataframe()) == 51
+    assert Surface.open(surface_path) is fourth
+
+
+def test_surface_reads_both_ini_files(tmp_path):
+    sf = Surface(_write_surface(tmp_path))
+
+    assert sf.site_details == {"Phase": "BreR", "Field": "Iso"}
+    assert sf.surface_details["Label Prefix"] == "Ref"
+    assert sf.surface_details["Created"] == datetime(2020, 1, 2, 9, 30, 5)
+    assert sf.surface_details["Full Name"] == "Iso Ref 2020-01-02 09:30:05"
@@ -0,0 +1,191 @@
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignrt_tools import treatment
+from alignrt_tools.treatment import TreatmentCalendar
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SCRIPT = """
+import sys
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+
+from alignrt_tools.treatment import TreatmentCalendar
+
+COLUMNS = [
+    " D.VRT (cm)",
+    " D.LNG (cm)",
+    " D.LAT (cm)",
+    " D.MAG (cm)",
+    " D.Rtn (deg)",
+    " D.Roll (deg)",
+    " D.Pitch (deg)",
+]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames = []
+    for day in range(3):
+        clock = pd.Timestamp(2020, 1, 2 + day, 9) + pd.to_timedelta(
+            np.arange(200) * 0.2, unit="s"
+        )
+        df = pd.DataFrame(rng.normal(scale=0.2, size=(200, 7)), columns=COLUMNS)
+        df[" XRayState"] = (np.arange(200) > 50).astype(np.float32)
+        df["Clock Time"] = clock
+        frames.append(df)
+    calendar = TreatmentCalendar(pd.concat(frames, ignore_index=True))
+
+    # Draw a plot first, so that any threads it starts are running
+    session = calendar.treatment_days[0].treatment_sessions[0]
+    session.get_translations_and_rotations_plot()
+
+    print(len(calendar.save_all_plots(sys.argv[1], workers={workers})))
+
+
+if __name__ == "__main__":
+    main()
+"""
+
+
+def _run_save_all_plots(tmp_path, workers):
+    script = tmp_path / "save_all_plots.py"
+    script.write_text(textwrap.dedent(SCRIPT).format(workers=workers))
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+
+    return subprocess.run(
+        [sys.executable, str(script), str(tmp_path / "plots")],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+
+def test_save_all_plots_after_plotting_exits(tmp_path):
+    result = _run_save_all_plots(tmp_path, None)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == "3"
+    assert len(list((tmp_path / "plots").glob("*.png"))) == 3
+
+
+def test_save_all_plots_with_workers_exits(tmp_path):
+    result = _run_save_all_plots(tmp_path, 2)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == "3"
+    assert len(list((tmp_path / "plots").glob("*.png"))) == 3
+
+
+@pytest.mark.parametrize("rows", [5, 19, 20, 200])
+@pytest.mark.parametrize("window", [3, 20])
+def test_centered_rolling_mean_matches_pandas(rows, window):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(rows, 3)), columns=["a", "b", "c"])
+    df.iloc[rows // 2, 1] = np.nan
+
+    result = treatment._centered_rolling_mean(df, window)
+
+    pd.testing.assert_frame_equal(result, df.rolling(window, center=True).mean())
+
+
+def test_centered_rolling_mean_is_single_threaded():
+    pytest.importorskip("numba")
+    pytest.importorskip("numbagg")
+
+    # Run in a fresh process, in which numba's thread pool has not started
+    script = (
+        "import numba, numpy as np, pandas as pd\n"
+        "from alignrt_tools.treatment import _centered_rolling_mean\n"
+        "_centered_rolling_mean(pd.DataFrame(np.ones((100, 3))), 20)\n"
+        "try:\n"
+        "    print(numba.threading_layer())\n"
+        "except ValueError:\n"
+        "    print('not started')\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run(
+        [sys.executable, "-c", script], env=env, capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split("\n")[-2] == "not started"
+
+
+def _deltas(clock_times):
+    clock = pd.to_datetime(clock_times)
+    return pd.DataFrame(
+        {" D.VRT (cm)": np.arange(len(clock), dtype=np.float32), "Clock Time": clock}
+    )
+
+
+def test_treatment_calendar_groups_by_day():
+    # Out of order, and on either side of midnight
+    df = _deltas(
+        [
+            "2020-01-03 09:00:01",
+            "2020-01-02 23:59:59",
+            "2020-01-05 00:00:00",
+            "2020-01-03 09:00:00",
+            "2020-01-02 10:00:00",
+        ]
+    )
+
+    calendar = TreatmentCalendar(df)
+
+    assert [td.treatment_date for td in calendar.treatment_days] == [
+        date(2020, 1, 2),
+        date(2020, 1, 3),
+        date(2020, 1, 5),
+    ]
+    sessions = [td.treatment_sessions for td in calendar.treatment_days]
+    assert [len(s) for s in sessions] == [1, 1, 1]
+
+    # Each session holds its day's rows in time order
+    session_df = sessions[0][0].get_treatment_session_as_dataframe()
+    assert session_df[" D.VRT (cm)"].tolist() == [4, 1]
+    assert session_df["True Elapsed Time (min)"].tolist() == pytest.approx(
+        [0, 839 + 59 / 60]
+    )
+    assert sessions[1][0].treatment_time == pd.Timestamp("2020-01-03 09:00:00")
+
+    # The caller's frame is not changed
+    assert "Date" not in df
+
+
+def test_treatment_calendar_without_deltas():
+    calendar = TreatmentCalendar(None)
+
+    assert calendar.treatment_days == []
+    assert calendar.get_treatment_day_by_date(date(2020, 1, 2)) is None
+
+
+def test_get_treatment_day_by_date():
+    df = _deltas(["2020-01-02 10:00:00", "2020-01-03 09:00:00"])
+    calendar = TreatmentCalendar(df)
+
+    assert calendar.get_treatment_day_by_date(date(2020, 1, 2)) is (
+        calendar.treatment_days[0]
+    )
+    assert calendar.get_treatment_day_by_date(date(2020, 1, 3)) is (
+        calendar.treatment_days[1]
+    )
+    assert calendar.get_treatment_day_by_date(date(2020, 1, 4)) is None
+
+    with pytest.raises(TypeError):
+        calendar.get_treatment_day_by_date("2020-01-02")
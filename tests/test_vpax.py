@@ -0,0 +1,94 @@
+import xml.etree.ElementTree
+
+import pytest
+
+from alignrt_tools import patient
+from alignrt_tools.patient import Patient, _parse_vpax
+
+VPAX = """<?xml version="1.0" encoding="utf-8"?>
+<Patient>
+  <!-- A comment before the details -->
+  <PatientID>12345</PatientID>
+  <Sites>
+    <?alignrt instruction?>
+    <!-- A comment among the sites -->
+    <Site>
+      <Description>Breast</Description>
+      <Phases>
+        <Phase>
+          <Description>BreR</Description>
+          <Fields>
+            <?alignrt instruction?>
+            <Field><Description>Iso</Description></Field>
+            <!-- A comment among the fields -->
+            <Field><Description>Tang</Description></Field>
+          </Fields>
+        </Phase>
+      </Phases>
+    </Site>
+  </Sites>
+</Patient>
+"""
+
+
+def _describe(px):
+    return [
+        (
+            site.details["Description"],
+            [
+                (
+                    phase.details["Description"],
+                    [f.details["Description"] for f in phase.fields],
+                )
+                for phase in site.phases
+            ],
+        )
+        for site in px.sites
+    ]
+
+
+def test_parse_vpax_skips_comments_and_instructions(tmp_path, monkeypatch):
+    vpax_path = tmp_path / "Patient Details.vpax"
+    vpax_path.write_text(VPAX, encoding="utf-8")
+
+    expected = [("Breast", [("BreR", ["Iso", "Tang"])])]
+
+    px = Patient(tree=_parse_vpax(vpax_path))
+    assert px.details["PatientID"] == "12345"
+    assert _describe(px) == expected
+
+    # The standard library fallback builds the same tree
+    monkeypatch.setattr(patient, "ET", xml.etree.ElementTree)
+    px = Patient(tree=_parse_vpax(vpax_path))
+    assert px.details["PatientID"] == "12345"
+    assert _describe(px) == expected
+
+
+def test_parse_vpax_reuses_parser(tmp_path):
+    pytest.importorskip("lxml")
+
+    vpax_path = tmp_path / "Patient Details.vpax"
+    vpax_path.write_text(VPAX, encoding="utf-8")
+
+    for _ in range(3):
+        px = Patient(tree=_parse_vpax(vpax_path))
+        assert _describe(px) == [("Breast", [("BreR", ["Iso", "Tang"])])]
+
+
+def test_parse_vpax_does_not_resolve_external_entities(tmp_path):
+    pytest.importorskip("lxml")
+
+    secret_path = tmp_path / "secret.txt"
+    secret_path.write_text("secret", encoding="utf-8")
+    vpax_path = tmp_path / "Patient Details.vpax"
+    vpax_path.write_text(
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE Patient [<!ENTITY xxe SYSTEM "{}">]>\n'
+        "<Patient><PatientID>&xxe;</PatientID><Sites/></Patient>\n".format(
+            secret_path.as_uri()
+        ),
+        encoding="utf-8",
+    )
+
+    px = Patient(tree=_parse_vpax(vpax_path))
+    assert px.details.get("PatientID") != "secret"